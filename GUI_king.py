@@ -1,18 +1,18 @@
 from GUI_normal import OthelloWindow
 from GUI_normal import QApplication, sys, QPixmap, Qt, QPalette, QtGui, QLabel, QMessageBox
-from GUI_normal import BLACK, WHITE, PIECE_SIZE, pixel_to_coord, coord_to_pixel
-from minimax import KingOthello, BLACK_KING, WHITE_KING
+from GUI_normal import BLACK, WHITE, pixel_to_coord, scaled_pixmap
+from minimax import KingOthello, BLACK_KING, WHITE_KING, DIM
 from copy import deepcopy
 import time
 
 class KingOthelloWindow(OthelloWindow):
 
-    def __init__(self):
-        super().__init__()
+    def __init__(self, dim=DIM, animate_flips=False, store=None):
+        super().__init__(dim, animate_flips, store)
         self.init_UI()
 
     def init_UI(self): # override by redefining load_piece_asset
-        self.game = KingOthello()
+        self.game = self.new_game()
         OthelloWindow.load_background(self)
         self.load_piece_asset()
         self.setWindowTitle("Othello Game")
@@ -20,26 +20,29 @@ class KingOthelloWindow(OthelloWindow):
 
 
     def load_piece_asset(self): # override method by adding king piece assets
-        self.black_king_piece = QPixmap('img/black_king_piece.png').scaledToWidth(PIECE_SIZE)  # scale piece size to 90x90
-        self.white_king_piece = QPixmap('img/white_king_piece.png').scaledToWidth(PIECE_SIZE)
         OthelloWindow.load_piece_asset(self)
+        self.piece_pixmaps[BLACK_KING] = scaled_pixmap('img/black_king_piece.png', self.piece_size)  # 90x90 on 8x8
+        self.piece_pixmaps[WHITE_KING] = scaled_pixmap('img/white_king_piece.png', self.piece_size)
 
 
     def mousePressEvent(self, e):
         # left click is normal piece
+        self.finish_animation() # a click during an animation shows its end at once
         if e.button() == Qt.LeftButton:
             x, y = e.x(), e.y()  # mouse position (pixels)
-            j, i = pixel_to_coord(x, y)
+            j, i = pixel_to_coord(x, y, self.grid_size)
             if self.game.is_valid_move(i,j):
                 self.game.take_move(i, j)
+                self.game.history.append((i, j, False))
                 self.draw_board()
                 self.check_and_AI_move()
 
         elif e.button() == Qt.RightButton: # try to place a king
             x, y = e.x(), e.y()
-            j, i = pixel_to_coord(x, y)
+            j, i = pixel_to_coord(x, y, self.grid_size)
             if self.game.is_valid_move(i, j, is_king=True):
                 self.game.take_move(i, j, is_king=True)
+                self.game.history.append((i, j, True))
                 self.draw_board()
                 self.check_and_AI_move()
 
@@ -52,6 +55,7 @@ class KingOthelloWindow(OthelloWindow):
             ai_move = self.game.minimax_move()
             if ai_move:
                 self.game.take_move(ai_move[0], ai_move[1], ai_move[2])
+                self.game.history.append(ai_move)
                 self.game.switch_turn()  # hand over to Human, convenient to draw feasible moves
                 self.draw_board()
                 if not self.game.find_all_valid_moves(): # human player has no valid move
@@ -65,57 +69,22 @@ class KingOthelloWindow(OthelloWindow):
                 self.game_over()
 
 
-    def draw_piece(self, x, y, color):
-        if color == BLACK:
-            self.pieces[x * 8 + y].setPixmap(self.black_piece)
-        elif color == WHITE:
-            self.pieces[x * 8 + y].setPixmap(self.white_piece)
-        elif color == BLACK_KING:
-            self.pieces[x * 8 + y].setPixmap(self.black_king_piece)
-        elif color == WHITE_KING:
-            self.pieces[x * 8 + y].setPixmap(self.white_king_piece)
-        px, py = coord_to_pixel(x, y)
-        self.pieces[x * 8 + y].setGeometry(px, py, PIECE_SIZE, PIECE_SIZE)
+    def new_game(self): # drawing and game over are inherited, only the game differs
+        return KingOthello(dim=self.dim)
 
-
-    def draw_board(self):
-
-        # draw all pieces
-        h, w = self.game.board.shape
-        for i in range(h):
-            for j in range(w):
-                self.draw_piece(i, j, self.game.board[i, j])
-
-        # clear previous feasible move markers
-        for pos in self.feasibility:
-            pos.clear()
-        # self.feasibility = [QLabel(self) for i in range(64)]
-        feasible_moves = self.game.find_all_valid_moves()
-
-        # mark new feasible moves
-        for move in feasible_moves:
-            x, y = move[0], move[1]
-            self.feasibility[x * 8 + y].setPixmap(self.feasible_move)
-            px, py = coord_to_pixel(x, y)
-            self.feasibility[x * 8 + y].setGeometry(px + .3 * PIECE_SIZE, py, PIECE_SIZE, PIECE_SIZE)
-
-    def game_over(self):
-        # a message box to restart or quit game
-        msg = self.game.finish_count(return_option='summary').split('--')
-
-        reply = QMessageBox.question(self, msg[2].strip(), msg[1] + 'Restart?',
-                                     QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes)
-
-        if reply == QMessageBox.Yes:
-            self.game = KingOthello() # reset
-            for piece in self.pieces:
-                piece.clear()
-            self.draw_board()
-        else:
-            self.close()
+    def save_game(self):
+        if self.store:
+            from game_store import GameStore
+            with GameStore(self.store) as game_store:
+                game_store.add_game(self.game.history, black='human', white='minimax|1|king_pos_score', dim=self.dim,
+                                    variant='king')
 
 if __name__ == '__main__':
+    # optional board size, flip animation and game store: python GUI_king.py 10 --animate --store=games
     app = QApplication(sys.argv)
-    window = KingOthelloWindow()
+    sizes = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    stores = [arg.split('=', 1)[1] for arg in sys.argv[1:] if arg.startswith('--store=')]
+    window = KingOthelloWindow(int(sizes[0]) if sizes else DIM, animate_flips='--animate' in sys.argv,
+                               store=stores[0] if stores else None)
     window.show()
     sys.exit(app.exec_())
\ No newline at end of file
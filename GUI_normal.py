@@ -5,37 +5,65 @@ from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QPixmap, QIcon, QPalette, QPainter
 from PyQt5.QtMultimedia import QSound
 import minimax as mm
+from collections import deque
+from functools import lru_cache
+import numpy as np
+import time
 
 # this is the GUI for common Othello
+# draw_board only touches the squares and move markers that changed since the previous call; with animate_flips,
+# the flipped pieces turn ring by ring around the new piece on a QTimer, so the window keeps taking clicks meanwhile
 
+EMPTY = 0
 BLACK = 1
 WHITE = 2
 
 WINDOW_HEIGHT = 800
 WINDOW_WIDTH = 800
-GRID_SIZE = 100
+GRID_SIZE = 100 # on the default 8x8 board, other sizes split the same window into smaller squares
 PIECE_SIZE = 0.9 * GRID_SIZE  # 90
 GAP = (GRID_SIZE - PIECE_SIZE)/2 # 5
+BOARD_COLOR = QtGui.QColor(0, 128, 0) # drawn board for sizes other than 8x8, img/chessboard.png is 8x8
+FLIP_FRAME_MS = 60 # delay between two rings of an animated move
 
-def coord_to_pixel(x,y):
+def coord_to_pixel(x, y, grid_size=GRID_SIZE):
     # convert from 2-D array index to pixel on QWidget
     # a[0,0] -> (5,5); a[1,0] -> (5, 105)
-    return (GAP-1) + GRID_SIZE * y, (GAP-2) + GRID_SIZE * x # add minor shift to keep piece in center
+    gap = GAP * grid_size / GRID_SIZE
+    return (gap-1) + grid_size * y, (gap-2) + grid_size * x # add minor shift to keep piece in center
 
 
-def pixel_to_coord(x, y):
+def pixel_to_coord(x, y, grid_size=GRID_SIZE):
     # convert from pixel on QWidget to 2-D array coordinate
-    return int( (x-(GAP-2)) / GRID_SIZE ), int( (y-(GAP-1)) // GRID_SIZE )
+    gap = GAP * grid_size / GRID_SIZE
+    return int( (x-(gap-2)) / grid_size ), int( (y-(gap-1)) // grid_size )
+
+
+@lru_cache(maxsize=None)
+def scaled_pixmap(path, width):
+    # every image is loaded and scaled once per size, then shared by all redraws, restarts and windows
+    return QPixmap(path).scaledToWidth(int(width))
 
 
 class OthelloWindow(QMainWindow): # originally QWidget
 
-    def __init__(self):
+    def __init__(self, dim=mm.DIM, animate_flips=False, store=None):
         super().__init__()
+        self.store = store # game store directory finished games are appended to, see game_store.py
+        self.dim = dim # board size, the window keeps its size and the squares shrink
+        self.grid_size = WINDOW_WIDTH // dim
+        self.piece_size = 0.9 * self.grid_size
+        self.animate_flips = animate_flips
+        self.shown_board = None # the board as drawn once every pending frame is shown, draw_board diffs against it
+        self.shown_moves = set() # squares that carry a feasible move marker
+        self.pending_frames = deque() # animation frames not shown yet, each a list of (x, y, color)
+        self.frame_times = [] # seconds spent in every draw_board call
+        self.animation_timer = QtCore.QTimer(self)
+        self.animation_timer.timeout.connect(self.show_next_frame)
         # self.init_UI() # this line is commented if you use GUI_king, since this can lead to inaccurate feasible moves
 
     def init_UI(self):
-        self.game = mm.Othello()
+        self.game = mm.Othello(dim=self.dim)
         self.load_piece_asset()
         self.load_background()
         self.setMouseTracking(True)
@@ -44,36 +72,59 @@ class OthelloWindow(QMainWindow): # originally QWidget
     def load_background(self):
         # load chessboard as background
         palette1 = QPalette()
-        palette1.setBrush(self.backgroundRole(), QtGui.QBrush(QtGui.QPixmap('img/chessboard.png')))
+        palette1.setBrush(self.backgroundRole(), QtGui.QBrush(self.board_pixmap()))
         self.setPalette(palette1)
 
         # set each piece value to BLACK OR WHITE, else if draw new piece every time, the shade will overlay
-        self.pieces = [QLabel(self) for i in range(64)]
-        self.feasibility = [QLabel(self) for i in range(64)]
+        self.pieces = [QLabel(self) for i in range(self.dim * self.dim)]
+        self.feasibility = [QLabel(self) for i in range(self.dim * self.dim)]
+        for x in range(self.dim): # labels never move, only their pixmaps change
+            for y in range(self.dim):
+                px, py = coord_to_pixel(x, y, self.grid_size)
+                size = int(self.piece_size) # Qt geometry takes ints only
+                self.pieces[x * self.dim + y].setGeometry(int(px), int(py), size, size)
+                self.feasibility[x * self.dim + y].setGeometry(int(px + .3 * self.piece_size), int(py), size, size)
 
         # set window size and fix it
-        self.resize(WINDOW_WIDTH, WINDOW_HEIGHT)
-        self.setMinimumSize(QtCore.QSize(WINDOW_WIDTH, WINDOW_HEIGHT))
-        self.setMaximumSize(QtCore.QSize(WINDOW_WIDTH, WINDOW_HEIGHT))
+        width = height = self.grid_size * self.dim # equals WINDOW_WIDTH unless it does not divide by dim
+        self.resize(width, height)
+        self.setMinimumSize(QtCore.QSize(width, height))
+        self.setMaximumSize(QtCore.QSize(width, height))
 
         # set window name and icon
         self.setWindowTitle("Pistachio-Guoguo's Othello")  # 窗口名称
         self.setWindowIcon(QIcon('img/pistachio.png'))  # 窗口图标
 
+    def board_pixmap(self):
+        # background: the chessboard image for 8x8, a drawn grid of dim x dim squares otherwise
+        if self.dim == 8:
+            return QPixmap('img/chessboard.png')
+        size = self.grid_size * self.dim
+        pixmap = QPixmap(size, size)
+        pixmap.fill(BOARD_COLOR)
+        painter = QPainter(pixmap)
+        painter.setPen(Qt.black)
+        for k in range(self.dim + 1):
+            painter.drawLine(k * self.grid_size, 0, k * self.grid_size, size)
+            painter.drawLine(0, k * self.grid_size, size, k * self.grid_size)
+        painter.end()
+        return pixmap
 
     def load_piece_asset(self):
-        # load icons for black and white pieces, and scale to 90% of GRID_SIZE
-        self.black_piece = QPixmap('img/black_piece.png').scaledToWidth(PIECE_SIZE)  # scale piece size to 90x90
-        self.white_piece = QPixmap('img/white_piece.png').scaledToWidth(PIECE_SIZE)
-        self.feasible_move = QPixmap('img/asterisk.png').scaledToWidth(0.4 * PIECE_SIZE)
+        # load icons for black and white pieces, and scale to 90% of the grid size
+        self.piece_pixmaps = {BLACK: scaled_pixmap('img/black_piece.png', self.piece_size),  # 90x90 on 8x8
+                              WHITE: scaled_pixmap('img/white_piece.png', self.piece_size)}
+        self.feasible_move = scaled_pixmap('img/asterisk.png', 0.4 * self.piece_size)
 
     def mousePressEvent(self, e):
         # define the loop when a mouse click event is happen
         if e.button() == Qt.LeftButton:
+            self.finish_animation() # a click during an animation shows its end at once
             x, y = e.x(), e.y()  # mouse position (pixels)
-            j, i = pixel_to_coord(x, y)
+            j, i = pixel_to_coord(x, y, self.grid_size)
             if self.game.is_valid_move(i,j):
                 self.game.take_move(i, j)
+                self.game.history.append((i, j))
                 self.draw_board()
 
                 if self.game.is_game_end(): # check end-of-game after a move is taken
@@ -84,6 +135,7 @@ class OthelloWindow(QMainWindow): # originally QWidget
                     ai_move = self.game.random_move()
                     if ai_move:
                         self.game.take_move(ai_move[0], ai_move[1])
+                        self.game.history.append(ai_move)
                         self.game.switch_turn() # hand over to Human, convenient to draw feasible moves
                         self.draw_board()
                     else:
@@ -95,57 +147,113 @@ class OthelloWindow(QMainWindow): # originally QWidget
     def draw_piece(self, x, y, color) :
         """
         Format: self.draw_piece(5,3,BLACK)
-        Draw an assigned-color piece on screen, with indices in 2-D array
+        Draw an assigned-color piece on screen, with indices in 2-D array (EMPTY clears the square)
         """
-        if color == BLACK:
-            self.pieces[x * 8 + y].setPixmap(self.black_piece)
-        elif color == WHITE:
-            self.pieces[x * 8 + y].setPixmap(self.white_piece)
-        px, py = coord_to_pixel(x, y)
-        self.pieces[x * 8 + y].setGeometry(px, py, PIECE_SIZE, PIECE_SIZE)
-
-    def draw_board(self):
-
-        # draw all pieces
-        h, w = self.game.board.shape
-        for i in range(h):
-            for j in range(w):
-                self.draw_piece(i,j, self.game.board[i,j])
-
-        # clear previous feasible move markers
-        for pos in self.feasibility:
-            pos.clear()
-        feasible_moves = self.game.find_all_valid_moves()
-
+        pixmap = self.piece_pixmaps.get(color)
+        if pixmap is None:
+            self.pieces[x * self.dim + y].clear()
+        else:
+            self.pieces[x * self.dim + y].setPixmap(pixmap)
+
+    def draw_board(self, animate=None):
+        # update the squares that differ from the board drawn last time, and the markers that appear or disappear
+        # the move list comes from the game's cache, which the move that was just played or is_game_end fill anyway
+        start = time.perf_counter()
+        board = self.game.board
+        previous = self.shown_board
+        if previous is None or previous.shape != board.shape: # first draw: every square
+            previous = np.full(board.shape, EMPTY)
+            changed = [(x, y) for x in range(self.dim) for y in range(self.dim)]
+        else:
+            changed = [tuple(square) for square in np.argwhere(board != previous).tolist()]
+        self.shown_board = board.copy()
 
-        # mark new feasible moves
-        for move in feasible_moves:
-            x, y = move[0], move[1]
-            self.feasibility[x * 8 + y].setPixmap(self.feasible_move)
-            px, py = coord_to_pixel(x, y)
-            self.feasibility[x * 8 + y].setGeometry(px + .3 * PIECE_SIZE, py, PIECE_SIZE, PIECE_SIZE)
+        if self.animate_flips if animate is None else animate:
+            self.pending_frames.extend(self.change_frames(changed, previous, board))
+            if not self.animation_timer.isActive():
+                self.show_next_frame()
+        else:
+            self.finish_animation()
+            for x, y in changed:
+                self.draw_piece(x, y, board[x, y])
+
+        feasible_moves = {(move[0], move[1]) for move in self.game.find_all_valid_moves()}
+        for x, y in self.shown_moves - feasible_moves:
+            self.feasibility[x * self.dim + y].clear()
+        for x, y in feasible_moves - self.shown_moves:
+            self.feasibility[x * self.dim + y].setPixmap(self.feasible_move)
+        self.shown_moves = feasible_moves
+        self.frame_times.append(time.perf_counter() - start)
+
+    def change_frames(self, changed, previous, board):
+        # animation frames of one redraw: new pieces first, then the flipped pieces by distance from the nearest new one
+        placed = [(x, y) for x, y in changed if previous[x, y] == EMPTY]
+        rings = {}
+        for x, y in changed:
+            if previous[x, y] == EMPTY or not placed:
+                ring = 0
+            else:
+                ring = min(max(abs(x - px), abs(y - py)) for px, py in placed)
+            rings.setdefault(ring, []).append((x, y, board[x, y]))
+        return [rings[ring] for ring in sorted(rings)]
+
+    def show_next_frame(self):
+        # one animation step, the timer keeps running while frames are pending
+        if self.pending_frames:
+            for x, y, color in self.pending_frames.popleft():
+                self.draw_piece(x, y, color)
+        if not self.pending_frames:
+            self.animation_timer.stop()
+        elif not self.animation_timer.isActive():
+            self.animation_timer.start(FLIP_FRAME_MS)
+
+    def finish_animation(self):
+        while self.pending_frames:
+            self.show_next_frame()
+
+    def frame_time_summary(self):
+        if not self.frame_times:
+            return 'draw_board: no frames'
+        times_ms = sorted(t * 1000 for t in self.frame_times)
+        return 'draw_board: %d frames, %.2f ms mean, %.2f ms median, %.2f ms max' % (
+            len(times_ms), sum(times_ms) / len(times_ms), times_ms[len(times_ms) // 2], times_ms[-1])
+
+    def new_game(self):
+        return mm.Othello(dim=self.dim)
+
+    def save_game(self):
+        # the human plays black against the random AI
+        if self.store:
+            from game_store import GameStore
+            with GameStore(self.store) as game_store:
+                game_store.add_game(self.game.history, black='human', white='random', dim=self.dim)
 
 
     def game_over(self):
         # a message box to restart or quit game
         msg = self.game.finish_count(return_option='summary').split('--')
+        print(self.frame_time_summary())
+        self.save_game()
 
         reply = QMessageBox.question(self, msg[2].strip(), msg[1] + 'Restart?',
                                      QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes)
 
         if reply == QMessageBox.Yes:
-            self.game = mm.Othello() # reset
-            for piece in self.pieces:
-                piece.clear()
-            self.draw_board()
+            self.game = self.new_game() # reset, the redraw clears what the new board does not have
+            self.draw_board(animate=False)
         else:
             self.close()
 
 
 
 if __name__ == '__main__':
+    # optional board size, flip animation and game store: python GUI_normal.py 10 --animate --store=games
     app = QApplication(sys.argv)
-    window = OthelloWindow()
+    sizes = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    stores = [arg.split('=', 1)[1] for arg in sys.argv[1:] if arg.startswith('--store=')]
+    window = OthelloWindow(int(sizes[0]) if sizes else mm.DIM, animate_flips='--animate' in sys.argv,
+                           store=stores[0] if stores else None)
+    window.init_UI() # not called by __init__, see there
     window.show()
     sys.exit(app.exec_())
 
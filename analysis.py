@@ -0,0 +1,151 @@
+import minimax as mm
+from othello import Othello, EMPTY, BLACK, WHITE, DEPTH_GROWTH
+from collections import deque
+import multiprocessing
+import numpy as np
+import argparse
+import itertools
+import json
+import math
+import sys
+import time
+
+# Batch analysis: score every legal move of many positions read from a file.
+# Input, one position per line (blank lines and lines starting with '#' are skipped):
+#   <dim*dim board characters, row by row> <side to move>        (dim = 8 for normal Othello, any even size works)
+# board characters: '.', '-' or '0' empty, 'X', 'B' or '1' black, 'O', 'W' or '2' white
+# side to move: 'X', 'B' or '1' for black, 'O', 'W' or '2' for white
+# Output is one JSON object per input position, in input order, written as soon as it is ready.
+
+PIECE_CODES = {'.': EMPTY, '-': EMPTY, '0': EMPTY,
+               'X': BLACK, 'B': BLACK, '1': BLACK,
+               'O': WHITE, 'W': WHITE, '2': WHITE}
+BOARD_CHARS = {EMPTY: '.', BLACK: 'X', WHITE: 'O'}
+CHUNK_SIZE = 16 # positions sent to a worker at a time
+CHUNKS_IN_FLIGHT_PER_WORKER = 2 # bounds memory: input is only read this far ahead of the output
+
+
+def parse_position(line):
+    # 'board side' -> (board array, player)
+    fields = line.split()
+    dim = math.isqrt(len(fields[0])) if len(fields) == 2 else 0
+    if len(fields) != 2 or dim * dim != len(fields[0]) or dim < 4 or dim % 2:
+        raise ValueError('expected dim*dim board characters (dim even, 8 for normal Othello) and a side to move: %r'
+                         % line)
+    try:
+        board = np.array([PIECE_CODES[c] for c in fields[0].upper()]).reshape(dim, dim)
+        player = PIECE_CODES[fields[1].upper()]
+    except KeyError as e:
+        raise ValueError('unknown character %s in %r' % (e, line))
+    if player == EMPTY:
+        raise ValueError('side to move must be black or white: %r' % line)
+    return board, player
+
+
+def format_position(board, player):
+    # inverse of parse_position
+    return ''.join(BOARD_CHARS[v] for v in board.ravel()) + ' ' + BOARD_CHARS[player]
+
+
+def analyze_position(board, player, depth=1, eval_func='pos_score', time_limit=None):
+    """
+    Score every legal move of `player`, best first, with the principal variation of the best move.
+    With time_limit (seconds, a soft limit), search iteratively deeper from depth 0, never beyond `depth`, and only
+    start a depth when its estimated time (DEPTH_GROWTH times the last one) fits in what is left; depth 0 always
+    runs. 'depth' in the result is the last depth completed.
+    """
+    game = Othello()
+    game.board = board
+    game.current_player = player
+    result = {'position': format_position(board, player), 'moves': [], 'pv': [], 'depth': None}
+    if not game.find_all_valid_moves():
+        result['game_over'] = bool(game.is_game_end())
+        return result
+
+    start = time.perf_counter()
+    for current_depth in (range(depth + 1) if time_limit is not None else [depth]):
+        depth_start = time.perf_counter()
+        pvs = {}
+        move_eval_dict = game.score_all_moves(current_depth, eval_func, pvs)
+        result['depth'] = current_depth
+        now = time.perf_counter()
+        if time_limit is not None and now + (now - depth_start) * DEPTH_GROWTH - start > time_limit:
+            break
+    ranked = sorted(move_eval_dict, key=move_eval_dict.get, reverse=(player == BLACK)) # best first for either side
+    result['moves'] = [{'move': list(move), 'score': float(move_eval_dict[move])} for move in ranked]
+    result['pv'] = [list(ranked[0])] + [None if move is None else list(move) for move in pvs[ranked[0]]]
+    return result
+
+
+def analyze_lines(task):
+    # worker entry: analyze a chunk of (line number, text) pairs, errors are reported per line
+    lines, depth, eval_func, time_limit = task
+    results = []
+    for line_number, line in lines:
+        try:
+            board, player = parse_position(line)
+            result = analyze_position(board, player, depth, eval_func, time_limit)
+        except ValueError as e:
+            result = {'error': str(e)}
+        result['line'] = line_number
+        results.append(result)
+    return results
+
+
+def read_positions(stream):
+    # lazily yield (line number, text) for every position in the stream
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if line and not line.startswith('#'):
+            yield line_number, line
+
+
+def analyze_stream(in_stream, out_stream, depth=1, eval_func='pos_score', time_limit=None, workers=None):
+    """
+    Analyze every position of in_stream on `workers` processes (default: all cores) and write one JSON
+    line per position to out_stream in input order. Returns the number of positions written.
+    """
+    workers = workers or multiprocessing.cpu_count()
+    positions = read_positions(in_stream)
+    chunks = iter(lambda: list(itertools.islice(positions, CHUNK_SIZE)), [])
+    written = 0
+    with multiprocessing.Pool(workers) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.apply_async(analyze_lines, ((chunk, depth, eval_func, time_limit),)))
+            if len(pending) >= workers * CHUNKS_IN_FLIGHT_PER_WORKER:
+                written += write_results(pending.popleft().get(), out_stream)
+        while pending:
+            written += write_results(pending.popleft().get(), out_stream)
+    return written
+
+
+def write_results(results, out_stream):
+    for result in results:
+        out_stream.write(json.dumps(result) + '\n')
+    out_stream.flush()
+    return len(results)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Score every legal move for each position of a file')
+    parser.add_argument('input', help="positions file, '-' for stdin")
+    parser.add_argument('-o', '--output', default='-', help="JSON lines output, '-' for stdout")
+    parser.add_argument('-d', '--depth', type=int, default=1, help='search depth, or maximum depth with --time')
+    parser.add_argument('-e', '--eval-func', default='pos_score')
+    parser.add_argument('-t', '--time', type=float, default=None,
+                        help='seconds per position for iterative deepening, a soft limit: a depth is not started when '
+                             'it would likely overrun')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='processes, default: one per core')
+    args = parser.parse_args()
+
+    in_stream = sys.stdin if args.input == '-' else open(args.input)
+    out_stream = sys.stdout if args.output == '-' else open(args.output, 'w')
+    try:
+        count = analyze_stream(in_stream, out_stream, args.depth, args.eval_func, args.time, args.workers)
+    finally:
+        if in_stream is not sys.stdin:
+            in_stream.close()
+        if out_stream is not sys.stdout:
+            out_stream.close()
+    print('Analyzed %d positions.' % count, file=sys.stderr)
@@ -0,0 +1,238 @@
+import minimax as mm
+import othello
+import vectorized
+from othello import Othello, DIM
+from kingOthello import KingOthello
+import random
+import shutil
+import tempfile
+import time
+import sys
+
+# micro-benchmarks for the engine, run as: python benchmark.py [name ...]
+
+
+def sample_positions(num_positions=500, seed=0, dim=DIM):
+    # collect positions from random games, so every stage of the game is represented
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < num_positions:
+        game = Othello(dim=dim)
+        while len(positions) < num_positions:
+            moves = game.find_all_valid_moves()
+            if not moves:
+                game.switch_turn()
+                if not game.find_all_valid_moves():
+                    break # game over
+                continue
+            move = rng.choice(moves)
+            game.take_move(move[0], move[1])
+            game.switch_turn()
+            positions.append(game.board.copy())
+    return positions
+
+
+def sample_king_positions(num_positions=300, seed=0, dim=DIM):
+    # positions of random King Othello games, kings included
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < num_positions:
+        game = KingOthello(dim=dim)
+        while len(positions) < num_positions and not game.is_game_end():
+            moves = game.find_all_valid_moves()
+            if moves:
+                game.take_move(*rng.choice(moves))
+                positions.append(game.board.copy())
+            game.switch_turn()
+    return positions
+
+
+def time_function(func, args_list, repeat=3):
+    # best-of-repeat wall time for calling func once on each argument
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for args in args_list:
+            func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_mobility(num_positions=500):
+    positions = sample_positions(num_positions)
+    for board in positions + sample_king_positions(): # both versions must agree before timing means anything
+        assert mm.mobility(board) == mm.mobility_by_game(board)
+    args_list = [(board,) for board in positions]
+    t_old = time_function(mm.mobility_by_game, args_list)
+    t_new = time_function(mm.mobility, args_list)
+    t_all = time_function(mm.mobility_features, args_list)
+    print('mobility_by_game  : %8.1f us/position' % (t_old / num_positions * 1e6))
+    print('mobility          : %8.1f us/position (%.1fx)' % (t_new / num_positions * 1e6, t_old / t_new))
+    print('mobility_features : %8.1f us/position (moves + potential + frontier)' % (t_all / num_positions * 1e6))
+
+
+def bench_games(num_game=100):
+    # throughput of the plain game loop, dominated by legal move generation
+    start = time.perf_counter()
+    othello.AI_vs_AI(num_game, 'random', 'random', print_each_game_final=False, print_game_summary=False, seed=0)
+    elapsed = time.perf_counter() - start
+    print('AI_vs_AI random-random : %8.1f games/sec' % (num_game / elapsed))
+
+
+def bench_vectorized(num_game=100, num_vectorized=10000):
+    # scalar AI_vs_AI against the lockstep simulator for the strategies it supports
+    for black_strat, white_strat in [('random', 'random'), ('random', 'minimax|0|pos_score'),
+                                     ('minimax|0|mobi', 'minimax|0|pos_mobi')]:
+        start = time.perf_counter()
+        scalar_rate = othello.AI_vs_AI(num_game, black_strat, white_strat, print_each_game_final=False,
+                                       print_game_summary=False, seed=0)
+        scalar_speed = num_game / (time.perf_counter() - start)
+        start = time.perf_counter()
+        vector_rate = vectorized.simulate(num_vectorized, black_strat, white_strat, seed=0, print_game_summary=False)
+        vector_speed = num_vectorized / (time.perf_counter() - start)
+        print('%s vs %s : AI_vs_AI %.2f winrate, %.1f games/sec | simulate %.2f winrate, %.1f games/sec (%.0fx)'
+              % (black_strat, white_strat, scalar_rate, scalar_speed, vector_rate, vector_speed, vector_speed / scalar_speed))
+
+
+def bench_mcts(playouts=2000, num_game=10, opponent='minimax|2|pos_mobi', strategy='mcts|t=150ms'):
+    # search speed and tree size of one MCTS move, then a short match against minimax, playing both colors
+    game = Othello(seed=0)
+    game.mcts_move('mcts|%d|rollout' % playouts)
+    engine = game.mcts_engine
+    print('playouts/sec : %.0f' % (engine.last_playouts / engine.last_time))
+    print('nodes        : %d, %d bytes/node in the pool arrays' % (len(engine.pool), engine.pool.bytes_per_node()))
+    as_black = othello.AI_vs_AI(num_game, strategy, opponent, print_each_game_final=False, print_game_summary=False, seed=0)
+    as_white = 1 - othello.AI_vs_AI(num_game, opponent, strategy, print_each_game_final=False, print_game_summary=False, seed=1)
+    print('%s vs %s : winrate %.2f as black, %.2f as white' % (strategy, opponent, as_black, as_white))
+
+
+def bench_selective(depth=3, eval_func='pos_score', num_positions=40, num_game=10, time_per_move='100ms'):
+    # nodes and time per root search for each selective feature set, then matches against the full-width search:
+    # at the same depth, one ply deeper, and at the same time per move (both sides deepen until it is used up)
+    positions = sample_positions(num_positions, seed=1)[8:] # skip the opening, few moves there
+    variants = [None, ['pvs'], ['pvs', 'lmr'], ['probcut'], ['pvs', 'lmr', 'probcut']]
+    base_nodes = None
+    for selective in variants:
+        mm.search_stats['nodes'] = 0
+        start = time.perf_counter()
+        for i, board in enumerate(positions):
+            game = Othello()
+            game.board = board
+            game.current_player = mm.BLACK if i % 2 else mm.WHITE
+            game.score_all_moves(depth, eval_func, selective=selective)
+        elapsed = time.perf_counter() - start
+        nodes = mm.search_stats['nodes']
+        base_nodes = base_nodes or nodes
+        print('%-18s: %8d nodes (%5.1f%%), %6.1f ms/position'
+              % ('+'.join(selective or ['full width']), nodes, 100 * nodes / base_nodes, elapsed / len(positions) * 1000))
+    plain = 'minimax|%d|%s' % (depth, eval_func)
+    for selective_depth in (depth, depth + 1):
+        strategy = 'minimax|%d|%s|pvs+lmr+probcut' % (selective_depth, eval_func)
+        start = time.perf_counter()
+        as_black = othello.AI_vs_AI(num_game, strategy, plain, print_each_game_final=False, print_game_summary=False, seed=0)
+        as_white = 1 - othello.AI_vs_AI(num_game, plain, strategy, print_each_game_final=False, print_game_summary=False, seed=1)
+        print('%s vs %s : winrate %.2f as black, %.2f as white (%.1fs)'
+              % (strategy, plain, as_black, as_white, time.perf_counter() - start))
+    timed_plain = 'minimax|t=%s|%s' % (time_per_move, eval_func)
+    timed_selective = timed_plain + '|pvs+lmr+probcut'
+    start = time.perf_counter()
+    as_black = othello.AI_vs_AI(num_game, timed_selective, timed_plain, print_each_game_final=False,
+                                print_game_summary=False, seed=0)
+    as_white = 1 - othello.AI_vs_AI(num_game, timed_plain, timed_selective, print_each_game_final=False,
+                                    print_game_summary=False, seed=1)
+    print('%s vs %s : winrate %.2f as black, %.2f as white (%.1fs)'
+          % (timed_selective, timed_plain, as_black, as_white, time.perf_counter() - start))
+
+
+
+def bench_eval_cache(num_game=4, strategies=('minimax|2|pos_mobi', 'minimax|3|pos_score|pvs+lmr+probcut'),
+                     opponent='minimax|1|mobi'):
+    # the same seeded games with and without the leaf evaluation cache, the cache is kept across games and depths
+    for strategy in strategies:
+        for policy in (None, 'lru', 'clock'):
+            mm.eval_cache = None if policy is None else mm.use_eval_cache(policy=policy)
+            start = time.perf_counter()
+            othello.AI_vs_AI(num_game, strategy, opponent, print_each_game_final=False, print_game_summary=False, seed=0)
+            elapsed = time.perf_counter() - start
+            line = '%s, %-8s: %6.2fs' % (strategy, policy or 'no cache', elapsed)
+            if policy is not None:
+                stats = mm.eval_cache.stats()
+                line += ', hit rate %.2f, %d entries, %.1f MiB' % (stats['hit_rate'], stats['entries'], stats['bytes'] / 2**20)
+            print(line)
+    mm.eval_cache = None
+
+
+
+def bench_board_sizes(sizes=(8, 10, 12, 16), num_positions=200, depth=2, eval_func='pos_mobi', num_search=10):
+    # move generation (legal move lists per second, per-square scan against bitboards) and minimax nodes/sec per size
+    for dim in sizes:
+        positions = sample_positions(num_positions, seed=0, dim=dim)
+        games = []
+        for i, board in enumerate(positions):
+            game = Othello(dim=dim)
+            game.board = board
+            game.current_player = mm.BLACK if i % 2 else mm.WHITE
+            games.append((game,))
+        t_scan = time_function(Othello.scan_valid_moves, games, repeat=1)
+        t_bitboard = time_function(Othello.generate_valid_moves, games)
+        mm.search_stats['nodes'] = 0
+        start = time.perf_counter()
+        for (game,) in games[len(games) // 3:][:num_search]: # midgame positions
+            game.score_all_moves(depth, eval_func)
+        nodes_per_sec = mm.search_stats['nodes'] / (time.perf_counter() - start)
+        print('%2dx%-2d: scan %7.0f lists/sec, bitboard %7.0f lists/sec (%4.1fx) | minimax|%d|%s %6.0f nodes/sec'
+              % (dim, dim, len(games) / t_scan, len(games) / t_bitboard, t_scan / t_bitboard, depth, eval_func,
+                 nodes_per_sec))
+
+
+
+def bench_game_store(num_game=2000, num_lookups=2000):
+    # bulk import speed and size of a game store, then position lookups against the memory-mapped index
+    import game_store
+    records = []
+    othello.AI_vs_AI(num_game, 'random', 'random', print_each_game_final=False, print_game_summary=False, seed=0,
+                     records=records)
+    path = tempfile.mkdtemp()
+    try:
+        with game_store.GameStore(path) as store:
+            start = time.perf_counter()
+            store.import_games({'moves': moves, 'result': res, 'black': 'random', 'white': 'random'}
+                               for res, moves in records)
+            elapsed = time.perf_counter() - start
+            sizes = store.stats()['bytes']
+            print('import : %.0f games/sec, %.1f bytes/game in games.dat, %.1f bytes/position in index.bin'
+                  % (num_game / elapsed, sizes['games.dat'] / num_game, sizes['index.bin'] / store.stats()['index_entries']))
+        rng = random.Random(0)
+        queries = []
+        for _ in range(num_lookups):
+            res, moves = rng.choice(records)
+            board, player, ply = rng.choice(list(game_store.replay(moves)))
+            queries.append((board, player))
+        with game_store.GameStore(path) as store: # a fresh open: nothing is loaded besides the pages lookups touch
+            start = time.perf_counter()
+            found = sum(len(store.lookup(board, player)) for board, player in queries)
+            elapsed = time.perf_counter() - start
+        print('lookup : %.1f us/position, %.1f games per position on average' % (elapsed / num_lookups * 1e6,
+                                                                                 found / num_lookups))
+    finally:
+        shutil.rmtree(path)
+
+
+def bench_profiler(num_game=2, strategy='minimax|2|pos_mobi'):
+    # cost of profiling mode: the same seeded games with the profiler off and on
+    for profile in [False, True]:
+        start = time.perf_counter()
+        othello.AI_vs_AI(num_game, strategy, 'random', print_each_game_final=False, print_game_summary=False, seed=0,
+                         profile=profile)
+        print('profile=%s: %.2fs' % (profile, time.perf_counter() - start))
+
+
+BENCHMARKS = {'mobility': bench_mobility, 'games': bench_games, 'vectorized': bench_vectorized, 'mcts': bench_mcts,
+              'selective': bench_selective, 'eval_cache': bench_eval_cache, 'board_sizes': bench_board_sizes,
+              'game_store': bench_game_store, 'profiler': bench_profiler}
+
+if __name__ == '__main__':
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        print('---- %s ----' % name)
+        BENCHMARKS[name]()
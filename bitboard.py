@@ -0,0 +1,102 @@
+import numpy as np
+from functools import lru_cache
+
+# Bitboard helpers: one color of a board is packed into a python int, one bit per square,
+# where square (x, y) is bit number x * dim + y. Python ints have no fixed width, so the same
+# code works for any board size.
+
+SHIFT_DIRECTIONS = [(-1,0),(-1,1),(-1,-1),(0,1),(0,-1),(1,0),(1,1),(1,-1)] # same order as othello.DIRECTIONS
+
+
+@lru_cache(maxsize=None)
+def board_masks(dim):
+    # precompute, for a dim x dim board: the full-board mask and (shift, mask) for each direction
+    # the mask removes the bits that would wrap from one row to the next after shifting
+    full = (1 << (dim * dim)) - 1
+    first_col = last_col = 0
+    for x in range(dim):
+        first_col |= 1 << (x * dim)
+        last_col |= 1 << (x * dim + dim - 1)
+    shifts = []
+    for dx, dy in SHIFT_DIRECTIONS:
+        mask = full
+        if dy == 1:
+            mask &= ~first_col # moving right, nothing can land on the first column
+        elif dy == -1:
+            mask &= ~last_col
+        shifts.append((dx * dim + dy, mask))
+    return full, tuple(shifts)
+
+
+def shift(bits, amount, mask):
+    # move every bit one step in a direction, amount > 0 is towards higher indices
+    if amount > 0:
+        return (bits << amount) & mask
+    else:
+        return (bits >> -amount) & mask
+
+
+def pack(board, value):
+    # pack the squares of board equal to value into an int
+    flat = np.packbits(np.asarray(board).ravel() == value, bitorder='little')
+    return int.from_bytes(flat.tobytes(), 'little')
+
+
+def to_array(bits, dim, value=1):
+    # inverse of pack as a dim x dim int8 array, value on the set bits and 0 elsewhere
+    num_squares = dim * dim
+    flat = np.unpackbits(np.frombuffer(bits.to_bytes((num_squares + 7) // 8, 'little'), dtype=np.uint8),
+                         bitorder='little')[:num_squares]
+    return (flat * np.int8(value)).astype(np.int8).reshape(dim, dim)
+
+
+def unpack(bits, dim):
+    # inverse of pack: list of (x, y) tuples for every set bit, in row-major order
+    coords = []
+    while bits:
+        low = bits & -bits
+        index = low.bit_length() - 1
+        coords.append((index // dim, index % dim))
+        bits ^= low
+    return coords
+
+
+def legal_moves(own, opp, dim, empty=None):
+    # all squares where the owner of `own` may play, as a bitboard
+    # empty: the empty squares, when pieces other than own and opp (King Othello kings) are on the board; such pieces
+    # are neither landing squares nor part of a line
+    full, shifts = board_masks(dim)
+    if empty is None:
+        empty = full & ~(own | opp)
+    moves = 0
+    for amount, mask in shifts:
+        line = shift(own, amount, mask) & opp
+        for _ in range(dim - 3): # at most dim - 2 opponent pieces can be sandwiched
+            line |= shift(line, amount, mask) & opp
+        moves |= shift(line, amount, mask) & empty
+    return moves
+
+
+def neighbours(bits, dim):
+    # every square adjacent to at least one set bit
+    full, shifts = board_masks(dim)
+    result = 0
+    for amount, mask in shifts:
+        result |= shift(bits, amount, mask)
+    return result
+
+
+
+def flips(own, opp, index, dim):
+    # pieces of opp that are reversed when own plays on square `index`, as a bitboard
+    full, shifts = board_masks(dim)
+    flipped = 0
+    for amount, mask in shifts:
+        line = 0
+        square = shift(1 << index, amount, mask)
+        while square & opp:
+            line |= square
+            square = shift(square, amount, mask)
+        if square & own:
+            flipped |= line
+    return flipped
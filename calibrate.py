@@ -0,0 +1,83 @@
+import minimax as mm
+from othello import Othello, DIM
+from benchmark import sample_positions
+import numpy as np
+import argparse
+import json
+
+# Fit the ProbCut parameters used by minimax(selective=['probcut']).
+# For sample positions, search every deep depth d and the matching shallow depth d - gap, then fit
+# deep = a * shallow + b by least squares for every game stage; sigma is the standard deviation of the residuals.
+# Parameters are per board size, searches on other sizes run without ProbCut.
+# Usage: python calibrate.py --eval-func pos_score --depths 2,3 --positions 300 [--dim 10]
+
+MIN_SAMPLES = 10 # stages with fewer positions get no parameters, ProbCut is then off there
+
+
+def collect_values(positions, depth, shallow_depth, eval_func):
+    # {stage: ([shallow values], [deep values])}, scores from Black's point of view like every minimax value
+    samples = {}
+    for board, player in positions:
+        shallow = mm.minimax(board, shallow_depth, player, eval_func=eval_func)
+        deep = mm.minimax(board, depth, player, eval_func=eval_func)
+        stage_samples = samples.setdefault(mm.game_stage(board), ([], []))
+        stage_samples[0].append(shallow)
+        stage_samples[1].append(deep)
+    return samples
+
+
+def fit(samples, eval_func, depth, shallow_depth, dim=DIM):
+    params = []
+    for stage, (shallow, deep) in sorted(samples.items()):
+        if len(shallow) < MIN_SAMPLES:
+            continue
+        a, b = np.polyfit(shallow, deep, 1)
+        sigma = float(np.std(np.array(deep) - (a * np.array(shallow) + b)))
+        params.append({'eval_func': eval_func, 'dim': dim, 'depth': depth, 'stage': stage,
+                       'shallow_depth': shallow_depth, 'a': float(a), 'b': float(b), 'sigma': sigma, 'samples': len(shallow)})
+    return params
+
+
+def playable_positions(num_positions, seed, dim=DIM):
+    # sample positions, keeping only those where the side to move has a move
+    positions = []
+    for board in sample_positions(num_positions, seed, dim):
+        game = Othello(dim=dim)
+        game.board = board
+        game.current_player = mm.BLACK if np.count_nonzero(board != mm.EMPTY) % 2 == 0 else mm.WHITE
+        if not game.find_all_valid_moves():
+            game.switch_turn()
+        if game.find_all_valid_moves():
+            positions.append((board, game.current_player))
+    return positions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fit ProbCut parameters for minimax')
+    parser.add_argument('-e', '--eval-func', default='pos_score')
+    parser.add_argument('-d', '--depths', default='2,3', help='comma separated deep depths')
+    parser.add_argument('-g', '--gap', type=int, default=2, help='deep depth - shallow depth')
+    parser.add_argument('-n', '--positions', type=int, default=300)
+    parser.add_argument('-s', '--seed', type=int, default=0)
+    parser.add_argument('--dim', type=int, default=DIM, help='board size the parameters are for')
+    parser.add_argument('-o', '--output', default=mm.PROBCUT_PARAMS_FILE)
+    args = parser.parse_args()
+
+    positions = playable_positions(args.positions, args.seed, args.dim)
+    try: # keep the parameters of other eval_funcs, board sizes and depths
+        with open(args.output) as f:
+            all_params = json.load(f)
+    except FileNotFoundError:
+        all_params = []
+    for depth in [int(d) for d in args.depths.split(',')]:
+        shallow_depth = max(0, depth - args.gap)
+        params = fit(collect_values(positions, depth, shallow_depth, args.eval_func), args.eval_func, depth, shallow_depth,
+                     args.dim)
+        key = (args.eval_func, args.dim, depth)
+        all_params = [p for p in all_params if (p['eval_func'], p.get('dim', DIM), p['depth']) != key] + params
+        for p in params:
+            print('%dx%d %s depth %d <- %d, stage %d: a=%.3f b=%.2f sigma=%.2f (%d positions)'
+                  % (args.dim, args.dim, p['eval_func'], depth, shallow_depth, p['stage'], p['a'], p['b'], p['sigma'],
+                     p['samples']))
+    with open(args.output, 'w') as f:
+        json.dump(all_params, f, indent=1)
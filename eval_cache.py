@@ -0,0 +1,113 @@
+from collections import OrderedDict
+import numpy as np
+import sys
+
+# Bounded cache of leaf evaluations, keyed by position and evaluator name.
+# It only stores static evaluations (no depths or alpha-beta bounds), so one cache can serve every search depth,
+# every root move and every game played by a process.
+
+DEFAULT_MAX_BYTES = 64 * 2**20
+DICT_ENTRY_BYTES = 100 # approximate bookkeeping of one entry in a dict / OrderedDict, on top of key and value
+POLICIES = ['lru', 'clock']
+
+
+def position_key(board, eval_func):
+    # one byte per square, hashed by python's bytes hash; exact, so there are no collisions to worry about
+    return board.astype(np.int8).tobytes(), eval_func
+
+
+def entry_bytes(key, value):
+    return sys.getsizeof(key) + sys.getsizeof(key[0]) + sys.getsizeof(value) + DICT_ENTRY_BYTES
+
+
+class EvalCache:
+    """
+    Bounded evaluation cache.
+    :param max_bytes: approximate memory cap, the oldest entries are evicted beyond it
+    :param policy: 'lru' evicts the least recently used entry; 'clock' evicts the first entry the clock hand finds
+                   that was not used since the hand last passed, cheaper on hits and close to LRU
+    """
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, policy='lru'):
+        if policy not in POLICIES:
+            raise ValueError('unknown eviction policy %r, use one of %s' % (policy, POLICIES))
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.clear()
+
+    def clear(self):
+        self.entries = OrderedDict() if self.policy == 'lru' else {} # key -> value, or key -> slot for clock
+        self.slot_keys = [] # clock only: key, value and reference bit of every slot
+        self.slot_values = []
+        self.referenced = bytearray()
+        self.hand = 0
+        self.bytes = 0
+        self.hits = self.misses = self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        # cached value or None
+        if self.policy == 'lru':
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+        else:
+            slot = self.entries.get(key)
+            value = None
+            if slot is not None:
+                self.referenced[slot] = 1
+                value = self.slot_values[slot]
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def put(self, key, value):
+        size = entry_bytes(key, value)
+        if self.policy == 'lru':
+            self.entries[key] = value
+            self.bytes += size
+            while self.bytes > self.max_bytes and len(self.entries) > 1:
+                old_key, old_value = self.entries.popitem(last=False)
+                self.bytes -= entry_bytes(old_key, old_value)
+                self.evictions += 1
+        else:
+            if self.bytes + size > self.max_bytes and self.slot_keys:
+                slot = self.evict_clock()
+                self.slot_keys[slot], self.slot_values[slot], self.referenced[slot] = key, value, 0
+            else:
+                slot = len(self.slot_keys)
+                self.slot_keys.append(key)
+                self.slot_values.append(value)
+                self.referenced.append(0)
+            self.entries[key] = slot
+            self.bytes += size
+
+    def evict_clock(self):
+        # advance the hand past referenced slots (clearing their bit), free the first unreferenced one
+        while self.referenced[self.hand]:
+            self.referenced[self.hand] = 0
+            self.hand = (self.hand + 1) % len(self.slot_keys)
+        slot = self.hand
+        old_key = self.slot_keys[slot]
+        del self.entries[old_key]
+        self.bytes -= entry_bytes(old_key, self.slot_values[slot])
+        self.evictions += 1
+        self.hand = (self.hand + 1) % len(self.slot_keys)
+        return slot
+
+    def evaluate(self, board, eval_func, compute):
+        # cached compute(board, eval_func)
+        key = position_key(board, eval_func)
+        value = self.get(key)
+        if value is None:
+            value = compute(board, eval_func)
+            self.put(key, value)
+        return value
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'entries': len(self.entries),
+                'bytes': self.bytes, 'hit_rate': self.hits / lookups if lookups else 0.0}
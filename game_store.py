@@ -0,0 +1,608 @@
+import minimax as mm
+from othello import DIM, EMPTY, BLACK, WHITE, opposite
+from kingOthello import KingOthello
+import bitboard as bb
+from functools import lru_cache
+import numpy as np
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import shutil
+import struct
+import sys
+try:
+    import fcntl
+except ImportError: # no advisory locks on Windows, keep to one writer there
+    fcntl = None
+
+# Append-only store of finished games, with an index of every position they reached.
+# A store is a directory of plain files:
+#   games.dat        records: a HEADER followed by one byte per move
+#   offsets.u64      byte offset of every record, a game id is a position in this file; appending the offset is
+#                    what commits a game: readers ignore anything written after the last offset, and the next writer
+#                    drops it (see recover)
+#   strategies.txt   strategy names, one per line, records refer to them by line number
+#   index.bin        INDEX_HEADER, then the sorted 64-bit position hashes, then the (game, ply, symmetry) of each;
+#                    memory-mapped, so a lookup is a binary search that only touches a few pages
+#   tail_hash.u64, tail_entry.bin   unsorted hashes and entries of games added since the last merge_index
+#   lock             held (fcntl.flock) by the one process writing the store; readers never take it
+# Positions are hashed in canonical form: the smallest of the 8 rotations / reflections of the board, plus the side
+# to move and, for King Othello, the variant and the kings both players have left (see variant_key), so games that
+# reached a position in another orientation are found too, and games of the other variant are not. Position ply k is the board before
+# move k is played, ply len(moves) is the final board, stored with side to move EMPTY.
+# Moves are one byte: x * dim + y (dim <= 16), or (x * dim + y) * 2 + is_king for KingOthello (dim <= 11).
+# Passes are not stored, replaying a game infers them.
+# Usage: python game_store.py STORE import games.jsonl | export games.jsonl | compact | stats | lookup '<position>'
+
+HEADER = struct.Struct('<HhBBHH') # moves, num_black - num_white, dim, variant, black strategy, white strategy
+HEADER_DTYPE = np.dtype([('moves', '<u2'), ('result', '<i2'), ('dim', 'u1'), ('variant', 'u1'), ('black', '<u2'),
+                         ('white', '<u2')]) # HEADER as a numpy record, for reading many headers at once
+INDEX_HEADER = struct.Struct('<QQ') # entries, games covered by the sorted index (the tail holds the rest)
+VARIANTS = ['normal', 'king']
+HASH_DTYPE = np.dtype('<u8')
+ENTRY_DTYPE = np.dtype([('game', '<u4'), ('ply', '<u2'), ('sym', 'u1')])
+OFFSET_DTYPE = np.dtype('<u8')
+MAX_TAIL_ENTRIES = 1000000 # lookups scan the tail, add_games merges it into the index beyond this size
+IMPORT_BATCH = 10000 # games replayed and hashed at a time by import_games
+
+
+@lru_cache(maxsize=None)
+def symmetries(dim):
+    # sources[k][p]: square of a board that lands on square p under symmetry k, targets[k][s]: where square s lands
+    index = np.arange(dim * dim).reshape(dim, dim)
+    views = [np.rot90(index, k) for k in range(4)] + [np.rot90(index.T, k) for k in range(4)]
+    sources = np.array([view.ravel() for view in views])
+    return sources, np.argsort(sources, axis=1)
+
+
+def position_hash(board, player, key=b''):
+    # (64-bit hash of the canonical form of the position, symmetry that maps board onto the canonical form)
+    # key: variant_key of the game, hashed along with the board
+    sources = symmetries(board.shape[0])[0]
+    images = [image.tobytes() for image in np.asarray(board, dtype=np.int8).ravel()[sources]]
+    sym = min(range(len(images)), key=images.__getitem__)
+    digest = hashlib.blake2b(images[sym] + bytes([player]) + key, digest_size=8).digest()
+    return int.from_bytes(digest, 'little'), sym
+
+
+def variant_key(variant='normal', kings=None):
+    # what besides the board tells positions apart: nothing in normal games (so their hashes do not change),
+    # the variant and (black, white) kings left in King Othello
+    if variant not in VARIANTS:
+        raise ValueError('unknown variant %r' % variant)
+    if variant == 'normal':
+        return b''
+    if kings is None:
+        raise ValueError('King Othello positions need the kings left, (black, white)')
+    return bytes([VARIANTS.index(variant)] + [int(count) for count in kings])
+
+
+def side_to_move(board, player):
+    # who really moves next in a normal game: player, the opponent if player has to pass, EMPTY if the game is over
+    dim = board.shape[0]
+    own, opp = bb.pack(board, player), bb.pack(board, opposite(player))
+    if bb.legal_moves(own, opp, dim):
+        return player
+    if bb.legal_moves(opp, own, dim):
+        return opposite(player)
+    return EMPTY
+
+
+def encode_move(move, dim, variant):
+    square = move[0] * dim + move[1]
+    return square * 2 + bool(move[2]) if variant == 'king' else square
+
+
+def decode_move(code, dim, variant):
+    if variant == 'king':
+        square, is_king = divmod(code, 2)
+        return square // dim, square % dim, bool(is_king)
+    return code // dim, code % dim
+
+
+def replay(moves, dim=DIM, variant='normal'):
+    # yield (board, side to move, ply) for every position of a game, ValueError at an illegal move
+    for board, player, ply, key in positions(moves, dim, variant):
+        yield board, player, ply
+
+
+def positions(moves, dim=DIM, variant='normal'):
+    # replay, with the variant_key of every position
+    if variant == 'king':
+        for board, player, ply, kings in replay_king(moves, dim):
+            yield board, player, ply, variant_key(variant, kings)
+        return
+    center = dim // 2
+    own = 1 << (center - 1) * dim + center - 1 | 1 << center * dim + center # black
+    opp = 1 << (center - 1) * dim + center | 1 << center * dim + center - 1
+    player = BLACK
+    for ply, move in enumerate(moves):
+        square = move[0] * dim + move[1]
+        if (own | opp) >> square & 1:
+            raise ValueError('illegal move %s at ply %d' % (tuple(move), ply))
+        flipped = bb.flips(own, opp, square, dim) # a move is legal when it flips something
+        if not flipped:
+            if bb.legal_moves(own, opp, dim): # only a player without moves passes
+                raise ValueError('illegal move %s at ply %d' % (tuple(move), ply))
+            own, opp, player = opp, own, opposite(player)
+            flipped = bb.flips(own, opp, square, dim)
+            if not flipped:
+                raise ValueError('illegal move %s at ply %d' % (tuple(move), ply))
+        yield board_from_bits(own, opp, player, dim), player, ply, b''
+        own, opp = opp & ~flipped, own | flipped | 1 << square
+        player = opposite(player)
+    yield board_from_bits(own, opp, player, dim), EMPTY, len(moves), b''
+
+
+def board_from_bits(own, opp, player, dim):
+    black, white = (own, opp) if player == BLACK else (opp, own)
+    return bb.to_array(black, dim, BLACK) + bb.to_array(white, dim, WHITE)
+
+
+def replay_king(moves, dim):
+    # yield (board, side to move, ply, (black, white) kings left)
+    game = KingOthello(dim=dim)
+    for ply, (x, y, is_king) in enumerate(moves):
+        if not game.is_valid_move(x, y, is_king):
+            if game.find_all_valid_moves():
+                raise ValueError('illegal move %s at ply %d' % ((x, y, is_king), ply))
+            game.switch_turn()
+            if not game.is_valid_move(x, y, is_king):
+                raise ValueError('illegal move %s at ply %d' % ((x, y, is_king), ply))
+        yield game.board.copy(), game.current_player, ply, (game.black_king_remain, game.white_king_remain)
+        game.take_move(x, y, is_king)
+        game.switch_turn()
+    yield game.board.copy(), EMPTY, len(moves), (game.black_king_remain, game.white_king_remain)
+
+
+def final_result(board):
+    # num_black - num_white, kings included
+    return int(np.count_nonzero(np.isin(board, (BLACK, mm.BLACK_KING)))
+               - np.count_nonzero(np.isin(board, (WHITE, mm.WHITE_KING))))
+
+
+class GameStore:
+    """
+    Append-only game store, see above. Games are dicts:
+    {'moves': [(x, y), ...], 'result': num_black - num_white, 'dim': 8, 'variant': 'normal', 'black': '', 'white': ''}
+    ('result' is computed from the final board when missing).
+    Opening a store only reads it. The first write takes the lock file, which this object keeps until close(), so
+    one process writes a store at a time while any number read it.
+    """
+    def __init__(self, path):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.maps = {} # memory-mapped arrays, kept until this object writes to the store or refresh() is called
+        self.lock_file = None # open while this object is the writer
+        self.load_strategies()
+
+    def load_strategies(self):
+        self.strategies = []
+        if os.path.exists(self.file('strategies.txt')):
+            with open(self.file('strategies.txt'), encoding='utf-8') as f:
+                self.strategies = f.read().splitlines()
+        self.strategy_ids = {name: i for i, name in enumerate(self.strategies)}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.maps = {}
+        if self.lock_file is not None:
+            self.lock_file.close() # releases the lock
+            self.lock_file = None
+
+    def refresh(self):
+        # forget the memory maps, so that games appended by another process since become visible
+        self.maps = {}
+        self.load_strategies()
+
+    def lock(self):
+        # become the writer: wait for the lock file, then repair whatever an interrupted writer left behind
+        if self.lock_file is not None:
+            return
+        self.lock_file = open(self.file('lock'), 'a')
+        if fcntl is not None:
+            fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+        self.refresh()
+        self.recover()
+
+    def file(self, name):
+        return os.path.join(self.path, name)
+
+    def size(self, name):
+        try:
+            return os.path.getsize(self.file(name))
+        except FileNotFoundError:
+            return 0
+
+    def truncate(self, name, size):
+        self.maps = {}
+        with open(self.file(name), 'ab') as f:
+            f.truncate(size)
+
+    # ------------ memory maps ---------------
+
+    def array(self, name, dtype, offset=0, count=None):
+        # part of a file as a read-only numpy array over a memory map (count=None: up to the end of the file)
+        key = (name, offset, dtype)
+        if key not in self.maps:
+            if count is None:
+                count = max(0, self.size(name) - offset) // dtype.itemsize
+            if count == 0:
+                self.maps[key] = np.zeros(0, dtype)
+            else:
+                self.maps[key] = np.memmap(self.file(name), dtype=dtype, mode='r', offset=offset, shape=(count,))
+        return self.maps[key]
+
+    def index_header(self):
+        if self.size('index.bin') < INDEX_HEADER.size:
+            return 0, 0
+        with open(self.file('index.bin'), 'rb') as f:
+            return INDEX_HEADER.unpack(f.read(INDEX_HEADER.size))
+
+    def index(self):
+        # (sorted hashes, entries, games covered) of index.bin
+        if 'index' not in self.maps:
+            num_entries, games_indexed = self.index_header()
+            hashes = self.array('index.bin', HASH_DTYPE, INDEX_HEADER.size, num_entries)
+            entries = self.array('index.bin', ENTRY_DTYPE, INDEX_HEADER.size + num_entries * HASH_DTYPE.itemsize,
+                                 num_entries)
+            self.maps['index'] = (hashes, entries, games_indexed)
+        return self.maps['index']
+
+    def tail(self):
+        if 'tail' not in self.maps:
+            num_entries = min(self.size('tail_hash.u64') // HASH_DTYPE.itemsize,
+                              self.size('tail_entry.bin') // ENTRY_DTYPE.itemsize)
+            self.maps['tail'] = (self.array('tail_hash.u64', HASH_DTYPE, 0, num_entries),
+                                 self.array('tail_entry.bin', ENTRY_DTYPE, 0, num_entries))
+        return self.maps['tail']
+
+    # ------------ records ---------------
+
+    def __len__(self):
+        return len(self.array('offsets.u64', OFFSET_DTYPE))
+
+    def data(self):
+        # games.dat, mapped after offsets.u64: records are written before their offsets, so every committed
+        # game is inside the map even while a writer appends
+        self.array('offsets.u64', OFFSET_DTYPE)
+        return self.array('games.dat', np.dtype('u1'))
+
+    def header(self, game_id):
+        # (offset of the moves, num_moves, result, dim, variant, black id, white id) of a game
+        offsets = self.array('offsets.u64', OFFSET_DTYPE)
+        if not 0 <= game_id < len(offsets):
+            raise IndexError('no game %d in %s' % (game_id, self.path))
+        offset = int(offsets[game_id])
+        fields = HEADER.unpack(self.data()[offset:offset + HEADER.size].tobytes())
+        return (offset + HEADER.size,) + fields
+
+    def game(self, game_id):
+        moves_offset, num_moves, result, dim, variant, black, white = self.header(game_id)
+        codes = self.data()[moves_offset:moves_offset + num_moves].tobytes()
+        variant = VARIANTS[variant]
+        if max(black, white) >= len(self.strategies): # named by a writer after this object read the names
+            self.load_strategies()
+        return {'id': game_id, 'moves': [decode_move(code, dim, variant) for code in codes], 'result': result,
+                'dim': dim, 'variant': variant, 'black': self.strategies[black], 'white': self.strategies[white]}
+
+    def games(self):
+        for game_id in range(len(self)):
+            yield self.game(game_id)
+
+    def strategy_id(self, name):
+        name = ' '.join(str(name).splitlines())
+        if name not in self.strategy_ids:
+            with open(self.file('strategies.txt'), 'a', encoding='utf-8') as f:
+                f.write(name + '\n')
+            self.strategy_ids[name] = len(self.strategies)
+            self.strategies.append(name)
+        return self.strategy_ids[name]
+
+    def encode(self, game):
+        # (header fields without the strategies, strategy names, move bytes, positions as (hash, ply, symmetry))
+        # of a game dict, after checking it by replaying it; writes nothing
+        if not isinstance(game, dict):
+            raise ValueError('not a game: %s' % (game,))
+        dim = int(game.get('dim', DIM))
+        variant = game.get('variant', 'normal')
+        if variant not in VARIANTS:
+            raise ValueError('unknown variant %r' % variant)
+        if dim * dim * (2 if variant == 'king' else 1) > 256:
+            raise ValueError('moves of a %dx%d %s game do not fit in one byte' % (dim, dim, variant))
+        moves = [tuple(move) for move in game['moves']]
+        hashed = []
+        for board, player, ply, key in positions(moves, dim, variant):
+            position_key, sym = position_hash(board, player, key)
+            hashed.append((position_key, ply, sym))
+        result = game.get('result')
+        if result is None:
+            result = final_result(board)
+        fields = (len(moves), int(result), dim, VARIANTS.index(variant))
+        names = (game.get('black', ''), game.get('white', ''))
+        return fields, names, bytes(encode_move(move, dim, variant) for move in moves), hashed
+
+    def add_games(self, games):
+        # append games and index their positions in the tail, returns the new game ids
+        # every game is checked first, so one bad game raises before anything is written
+        self.lock()
+        return self.append([self.encode(game) for game in games])
+
+    def append(self, encoded):
+        # write games returned by encode
+        first_id = game_id = len(self)
+        offset = self.size('games.dat')
+        offsets, hashes, entries = [], [], []
+        with open(self.file('games.dat'), 'ab') as data:
+            for fields, names, move_bytes, positions in encoded:
+                record = HEADER.pack(*fields, *[self.strategy_id(name) for name in names]) + move_bytes
+                data.write(record)
+                offsets.append(offset)
+                offset += len(record)
+                for key, ply, sym in positions:
+                    hashes.append(key)
+                    entries.append((game_id, ply, sym))
+                game_id += 1
+        # index first, then the offsets that commit the games
+        with open(self.file('tail_hash.u64'), 'ab') as f:
+            f.write(np.array(hashes, dtype=HASH_DTYPE).tobytes())
+        with open(self.file('tail_entry.bin'), 'ab') as f:
+            f.write(np.array(entries, dtype=ENTRY_DTYPE).tobytes())
+        with open(self.file('offsets.u64'), 'ab') as f:
+            f.write(np.array(offsets, dtype=OFFSET_DTYPE).tobytes())
+        self.maps = {}
+        if len(self.tail()[0]) > MAX_TAIL_ENTRIES:
+            self.merge_index()
+        return list(range(first_id, game_id))
+
+    def add_game(self, moves, result=None, black='', white='', dim=DIM, variant='normal'):
+        return self.add_games([{'moves': moves, 'result': result, 'black': black, 'white': white, 'dim': dim,
+                                'variant': variant}])[0]
+
+    def import_games(self, games, skipped=None):
+        # bulk import: games are added IMPORT_BATCH at a time, and the index is rebuilt once at the end
+        # games that are not valid are left out, and (number of the game from 0, error message) appended to skipped
+        self.lock()
+        count = 0
+        numbered = enumerate(games)
+        while True:
+            batch = list(itertools.islice(numbered, IMPORT_BATCH))
+            if not batch:
+                break
+            encoded = []
+            for number, game in batch:
+                try:
+                    encoded.append(self.encode(game))
+                except (ValueError, KeyError, TypeError, IndexError) as error:
+                    if skipped is not None:
+                        skipped.append((number, '%s: %s' % (type(error).__name__, error)))
+            count += len(self.append(encoded))
+        self.merge_index()
+        return count
+
+    # ------------ index ---------------
+
+    def write_index(self, hashes, entries, games_indexed):
+        # sort and replace index.bin in one os.replace, so readers see either the old or the new index
+        order = np.argsort(hashes, kind='stable')
+        tmp_path = self.file('index.bin.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(INDEX_HEADER.pack(len(hashes), games_indexed))
+            f.write(hashes[order].astype(HASH_DTYPE).tobytes())
+            f.write(entries[order].astype(ENTRY_DTYPE).tobytes())
+        self.maps = {}
+        os.replace(tmp_path, self.file('index.bin'))
+
+    def merge_index(self):
+        # fold the tail into the sorted index, rewriting it
+        self.lock()
+        hashes, entries, games_indexed = self.index()
+        tail_hashes, tail_entries = self.tail()
+        fresh = tail_entries['game'] >= games_indexed # a crash after the last merge can leave merged entries behind
+        self.write_index(np.concatenate([hashes, tail_hashes[fresh]]), np.concatenate([entries, tail_entries[fresh]]),
+                         len(self))
+        self.maps = {}
+        self.truncate('tail_hash.u64', 0)
+        self.truncate('tail_entry.bin', 0)
+
+    def recover(self):
+        # drop what an interrupted append or merge left behind: a partial offset, records and index entries
+        # of games whose offset was never written; only the writer may do this, so it takes the lock first
+        if self.lock_file is None:
+            self.lock() # which calls back here
+            return
+        self.truncate('offsets.u64', len(self) * OFFSET_DTYPE.itemsize)
+        count = len(self)
+        end = 0
+        if count:
+            moves_offset, num_moves = self.header(count - 1)[:2]
+            end = moves_offset + num_moves
+        if self.size('games.dat') > end:
+            self.truncate('games.dat', end)
+        tail_hashes, tail_entries = self.tail()
+        keep = tail_entries['game'] < count
+        if not keep.all() or self.size('tail_hash.u64') != len(tail_hashes) * HASH_DTYPE.itemsize \
+                or self.size('tail_entry.bin') != len(tail_entries) * ENTRY_DTYPE.itemsize:
+            tail_hashes, tail_entries = np.array(tail_hashes[keep]), np.array(tail_entries[keep])
+            self.maps = {}
+            with open(self.file('tail_hash.u64'), 'wb') as f:
+                f.write(tail_hashes.tobytes())
+            with open(self.file('tail_entry.bin'), 'wb') as f:
+                f.write(tail_entries.tobytes())
+        hashes, entries, games_indexed = self.index()
+        if games_indexed > count:
+            keep = entries['game'] < count
+            self.write_index(np.array(hashes[keep]), np.array(entries[keep]), count)
+        self.maps = {}
+
+    # ------------ queries ---------------
+
+    def lookup(self, board, player, variant='normal', kings=None):
+        """
+        Every game that reached a position: list of (game id, ply, next move, result), where next move is in the
+        orientation of `board` (None if the game ended there). In normal games a player who has to pass is replaced
+        by the opponent, and a finished position matches whatever player is given.
+        :param variant: only games of this variant match
+        :param kings: (black, white) kings left, needed for King Othello positions
+        """
+        board = np.asarray(board)
+        key = variant_key(variant, kings)
+        found, sym = self.find(board, player, key)
+        if not len(found) and variant == 'normal': # positions are indexed under the player who really moves
+            mover = side_to_move(board, player)
+            if mover != player:
+                found, sym = self.find(board, mover, key)
+        if not len(found):
+            return []
+
+        # headers and next moves of all the games at once
+        dim = board.shape[0]
+        sources, targets = symmetries(dim)
+        data = self.data()
+        plies = found['ply'].astype(np.int64)
+        starts = self.array('offsets.u64', OFFSET_DTYPE)[found['game']].astype(np.int64)
+        headers = data[starts[:, None] + np.arange(HEADER.size)].view(HEADER_DTYPE)[:, 0]
+        has_next = plies < headers['moves']
+        codes = np.where(has_next, data[np.where(has_next, starts + HEADER.size + plies, 0)], 0).astype(np.int64)
+        is_king = headers['variant'] == VARIANTS.index('king')
+        squares = np.where(is_king, codes // 2, codes)
+        squares = sources[sym][targets[found['sym'], squares]] # game orientation -> canonical -> board's
+
+        results = []
+        for game_id, ply, result, square, next_exists, king_variant, code in zip(
+                found['game'].tolist(), plies.tolist(), headers['result'].tolist(), squares.tolist(), has_next.tolist(),
+                is_king.tolist(), codes.tolist()):
+            if not next_exists:
+                next_move = None
+            elif king_variant:
+                next_move = (square // dim, square % dim, bool(code % 2))
+            else:
+                next_move = (square // dim, square % dim)
+            results.append((game_id, ply, next_move, result))
+        return results
+
+    def find(self, board, player, key=b''):
+        # (index entries of the position, symmetry of board), from the sorted index and the tail,
+        # leaving out games a writer has not committed yet
+        position_key, sym = position_hash(board, player, key)
+        position_key = np.uint64(position_key)
+        count = len(self)
+        hashes, entries, games_indexed = self.index()
+        tail_hashes, tail_entries = self.tail()
+        tail_found = tail_entries[np.flatnonzero(tail_hashes == position_key)]
+        found = np.concatenate([entries[np.searchsorted(hashes, position_key, 'left'):
+                                        np.searchsorted(hashes, position_key, 'right')],
+                                tail_found[tail_found['game'] >= games_indexed]])
+        return found[found['game'] < count], sym
+
+    def move_stats(self, board, player, variant='normal', kings=None):
+        # {next move: {'games', 'black_wins', 'white_wins', 'draws'}} over every game that reached the position,
+        # with None for the games that ended there
+        stats = {}
+        for game_id, ply, next_move, result in self.lookup(board, player, variant, kings):
+            move_stats = stats.setdefault(next_move, {'games': 0, 'black_wins': 0, 'white_wins': 0, 'draws': 0})
+            move_stats['games'] += 1
+            move_stats['black_wins' if result > 0 else 'white_wins' if result < 0 else 'draws'] += 1
+        return stats
+
+    def stats(self):
+        hashes, entries, games_indexed = self.index()
+        return {'games': len(self), 'strategies': len(self.strategies), 'index_entries': len(hashes),
+                'tail_entries': len(self.tail()[0]),
+                'bytes': {name: self.size(name) for name in ['games.dat', 'offsets.u64', 'strategies.txt',
+                                                             'index.bin', 'tail_hash.u64', 'tail_entry.bin']}}
+
+
+def export_jsonl(store, f):
+    # one JSON game per line, moves as lists, in game id order
+    count = 0
+    for game in store.games():
+        game = dict(game, moves=[list(move) for move in game['moves']])
+        del game['id']
+        f.write(json.dumps(game) + '\n')
+        count += 1
+    return count
+
+
+def import_jsonl(store, f, skipped=None):
+    return store.import_games(parse_jsonl(f), skipped)
+
+
+def parse_jsonl(f):
+    # games of a JSON lines file; a line that is not JSON gives its error, which import_games reports as skipped
+    for line in f:
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError as error:
+                yield error
+
+
+def compact(path):
+    """
+    Rewrite a store without duplicate games (same moves, result and metadata) and unused strategy names, with
+    the whole index sorted; it is built next to the store and swapped in. Returns (games before, games after).
+    """
+    tmp_path = path.rstrip(os.sep) + '.compact'
+    old_path = path.rstrip(os.sep) + '.old'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    seen = set()
+
+    def unique_games(store):
+        for game in store.games():
+            digest = hashlib.blake2b(json.dumps([game['moves'], game['result'], game['dim'], game['variant'],
+                                                 game['black'], game['white']]).encode(), digest_size=16).digest()
+            if digest not in seen:
+                seen.add(digest)
+                yield game
+
+    with GameStore(path) as store, GameStore(tmp_path) as new_store:
+        store.lock() # no writer may add games that the copy would miss
+        before = len(store)
+        after = new_store.import_games(unique_games(store))
+    os.replace(path, old_path)
+    os.replace(tmp_path, path)
+    shutil.rmtree(old_path)
+    return before, after
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Append-only Othello game store with a position index')
+    parser.add_argument('store', help='store directory')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('import', help='add games from a JSON lines file').add_argument('file')
+    commands.add_parser('export', help='write every game as JSON lines').add_argument('file')
+    commands.add_parser('compact', help='drop duplicate games and rebuild the index')
+    commands.add_parser('stats', help='number of games and file sizes')
+    lookup_parser = commands.add_parser('lookup', help='results by next move for a position (analysis.py format)')
+    lookup_parser.add_argument('position')
+    args = parser.parse_args()
+
+    if args.command == 'compact':
+        print('%d games -> %d games' % compact(args.store))
+    else:
+        with GameStore(args.store) as store:
+            if args.command == 'import':
+                skipped = []
+                with open(args.file) as f:
+                    print('imported %d games' % import_jsonl(store, f, skipped))
+                for number, error in skipped:
+                    print('skipped game %d: %s' % (number, error), file=sys.stderr)
+            elif args.command == 'export':
+                with (sys.stdout if args.file == '-' else open(args.file, 'w')) as f:
+                    count = export_jsonl(store, f)
+                print('exported %d games' % count, file=sys.stderr)
+            elif args.command == 'stats':
+                print(json.dumps(store.stats(), indent=1))
+            elif args.command == 'lookup':
+                from analysis import parse_position
+                board, player = parse_position(args.position)
+                for move, move_stats in store.move_stats(board, player).items():
+                    print(json.dumps({'move': None if move is None else list(move), **move_stats}))
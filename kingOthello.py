@@ -21,22 +21,23 @@ def king(player: int):
 
 class KingOthello(Othello):
 
-    def __init__(self):
-        super(KingOthello, self).__init__()
+    def __init__(self, seed=None, rng=None, dim=DIM):
+        super(KingOthello, self).__init__(seed, rng, dim)
         self.black_king_remain = self.white_king_remain = NUM_INITIAL_KING # provide each player with NUM_INITIAL_KING
         self.black_king_thres = self.white_king_thres = PLACE_KING_THRESHOLD
 
     def is_valid_move(self, x, y, is_king=False):
         # if is_king=True, decide whether the move is valid for a king piece, else calculate only for a normal piece
-        if is_inbound(x, y) and self.board[x, y] == EMPTY:
+        dim = self.dim
+        if is_inbound(x, y, dim) and self.board[x, y] == EMPTY:
             if not is_king: # only valid
                 for direction in DIRECTIONS:
                     new_x, new_y = x + direction[0], y + direction[1]
-                    if is_inbound(new_x, new_y) and self.board[new_x, new_y] == opposite(
+                    if is_inbound(new_x, new_y, dim) and self.board[new_x, new_y] == opposite(
                             self.current_player):  # make sure >= 1 opposite
-                        while is_inbound(new_x, new_y) and self.board[new_x, new_y] == opposite(self.current_player):
+                        while is_inbound(new_x, new_y, dim) and self.board[new_x, new_y] == opposite(self.current_player):
                             new_x, new_y = new_x + direction[0], new_y + direction[1]
-                        if is_inbound(new_x, new_y) and self.board[new_x, new_y] in [self.current_player, king(self.current_player)]:
+                        if is_inbound(new_x, new_y, dim) and self.board[new_x, new_y] in [self.current_player, king(self.current_player)]:
                             return True  # find one valid is enough
                 return False
             else: # this is a king piece
@@ -50,16 +51,16 @@ class KingOthello(Othello):
                 for direction in DIRECTIONS:
                     met_opponent_king = False # whether has enemy king in middle, if so, the two end must be self's two kings to reverse
                     new_x, new_y = x + direction[0], y + direction[1]
-                    if is_inbound(new_x, new_y) and self.board[new_x, new_y] in \
+                    if is_inbound(new_x, new_y, dim) and self.board[new_x, new_y] in \
                             [opposite(self.current_player), opp_king]:
                         if self.board[new_x, new_y] == opp_king:
                             met_opponent_king = True
-                        while is_inbound(new_x, new_y) and self.board[new_x, new_y] in \
+                        while is_inbound(new_x, new_y, dim) and self.board[new_x, new_y] in \
                             [opposite(self.current_player), opp_king]:
                             if self.board[new_x, new_y] == opp_king:
                                 met_opponent_king = True
                             new_x, new_y = new_x + direction[0], new_y + direction[1]
-                        if is_inbound(new_x, new_y) and self.board[new_x, new_y] in [self.current_player,
+                        if is_inbound(new_x, new_y, dim) and self.board[new_x, new_y] in [self.current_player,
                                                                                      king(self.current_player)]:
                             if not met_opponent_king:
                                 return True  # find one valid is enough
@@ -72,7 +73,9 @@ class KingOthello(Othello):
             return False
 
     def take_move(self, x, y, is_king=False):
+        dim = self.dim
         if self.is_valid_move(x, y, is_king=is_king):
+            self.moves_cache = {}
             if not is_king:
                 self.board[x, y] = self.current_player
             else:
@@ -89,23 +92,23 @@ class KingOthello(Othello):
                 new_x, new_y = x + direction[0], y + direction[1]
                 temp_list = [] # temp storage for each direction
                 if not is_king:
-                    if is_inbound(new_x, new_y) and self.board[new_x, new_y] == opposite(self.current_player):
-                        while is_inbound(new_x, new_y) and self.board[new_x, new_y] == opposite(self.current_player):
+                    if is_inbound(new_x, new_y, dim) and self.board[new_x, new_y] == opposite(self.current_player):
+                        while is_inbound(new_x, new_y, dim) and self.board[new_x, new_y] == opposite(self.current_player):
                             temp_list.append((new_x, new_y))
                             new_x, new_y = new_x + direction[0], new_y + direction[1]
-                        if is_inbound(new_x, new_y) and self.board[new_x, new_y] in [self.current_player, king(self.current_player)]: # valid direction
+                        if is_inbound(new_x, new_y, dim) and self.board[new_x, new_y] in [self.current_player, king(self.current_player)]: # valid direction
                             pieces_to_reverse.extend(temp_list) # move to final container
                 else: # king
                     met_opponent_king = False
-                    if is_inbound(new_x, new_y) and self.board[new_x, new_y] in [opposite(self.current_player), king(opposite(self.current_player))]:
+                    if is_inbound(new_x, new_y, dim) and self.board[new_x, new_y] in [opposite(self.current_player), king(opposite(self.current_player))]:
                         if self.board[new_x, new_y] == king(opposite(self.current_player)):
                             met_opponent_king = True
-                        while is_inbound(new_x, new_y) and self.board[new_x, new_y] in [opposite(self.current_player), king(opposite(self.current_player))]:
+                        while is_inbound(new_x, new_y, dim) and self.board[new_x, new_y] in [opposite(self.current_player), king(opposite(self.current_player))]:
                             if self.board[new_x, new_y] == king(opposite(self.current_player)):
                                 met_opponent_king = True
                             temp_list.append((new_x, new_y))
                             new_x, new_y = new_x + direction[0], new_y + direction[1]
-                        if is_inbound(new_x, new_y) and self.board[new_x, new_y] in [self.current_player, king(
+                        if is_inbound(new_x, new_y, dim) and self.board[new_x, new_y] in [self.current_player, king(
                                 self.current_player)]:  # valid direction
                             if not met_opponent_king:
                                 pieces_to_reverse.extend(temp_list)  # move to final container
@@ -118,23 +121,14 @@ class KingOthello(Othello):
         else:
             print("Invalid move.")
 
-    def is_game_end(self):
-        if not self.find_all_valid_moves(): # make sure 1st player has no valid moves
-            game_copy = deepcopy(self)
-            game_copy.switch_turn() # check whether the other player also has valid moves
-            return True if not game_copy.find_all_valid_moves() else False
-        else:
-            return False
-
-
     def test_flow(self, print_board=True, print_each_game_final=True):
 
         while not self.is_game_end():
             if self.find_all_valid_moves(): # if have valid moves for current player
                 while True:
                     new_move = self.minimax_move() # both black and white are minimax ai
-                    if self.is_valid_move(new_move[0], new_move[1]): # if entered a valid move
-                        self.take_move(new_move[0], new_move[1])
+                    if self.is_valid_move(new_move[0], new_move[1], new_move[2]): # if entered a valid move
+                        self.take_move(new_move[0], new_move[1], new_move[2])
                         self.switch_turn()
                         if print_board:
                             self.print_board() # print the game situation when a valid move is taken
@@ -147,11 +141,11 @@ class KingOthello(Othello):
         return self.finish_count(print_each_game_final= print_each_game_final) # num_black - num_white
 
 
-    def find_all_valid_moves(self):
+    def generate_valid_moves(self):
         # find all possible moves, return in form of: a list of tuples
         valid_moves = []
-        for i in range(DIM):
-            for j in range(DIM):
+        for i in range(self.dim):
+            for j in range(self.dim):
                 for is_king in [True, False]: # check for king and common pieces
                     if self.is_valid_move(i, j, is_king):
                         valid_moves.append((i, j, is_king))
@@ -166,17 +160,17 @@ class KingOthello(Othello):
                 king_move[move] = move_eval_dict[move]
             else:
                 common_move[move] = move_eval_dict[move]
+        if not king_move or not common_move: # no king left, or only a king can be placed: nothing to compare
+            return mm.best_by_score(king_move or common_move, self.current_player == BLACK, self.rng)
 
+        m1 = mm.best_by_score(king_move, self.current_player == BLACK, self.rng)
+        m2 = mm.best_by_score(common_move, self.current_player == BLACK, self.rng)
         if self.current_player == BLACK:
-            m1 = max(king_move, key=king_move.get)
-            m2 = max(common_move, key=common_move.get)
             if move_eval_dict[m1] - move_eval_dict[m2] > self.black_king_thres:
                 return m1
             else:
                 return m2
         else:
-            m1 = min(king_move, key=king_move.get)
-            m2 = min(common_move, key=common_move.get)
             if move_eval_dict[m1] - move_eval_dict[m2] < -self.white_king_thres:
                 return m1
             else:
@@ -196,8 +190,6 @@ class KingOthello(Othello):
                 move_eval_dict[move] = mm.minimax(game_copy.board, depth=depth, player=opposite(self.current_player),
                                                   eval_func=eval_func, king_version=True)
 
-            move_eval_dict = mm.shuffle_dict(move_eval_dict)  # shuffle the dict, or always choose the same move
-
             return self.best_move(move_eval_dict)
         else:
             return None
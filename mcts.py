@@ -0,0 +1,443 @@
+import minimax as mm
+from othello import BLACK, WHITE, EMPTY, opposite
+from kingOthello import KingOthello
+import bitboard as bb
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import atexit
+from copy import deepcopy
+import math
+import multiprocessing
+import os
+import random
+import time
+
+# Monte Carlo Tree Search (UCT) for Othello and KingOthello.
+# Strategy strings, as used by get_move / AI_vs_AI:
+#   'mcts|5000|rollout'    5000 playouts per move with uniformly random rollouts
+#   'mcts|t=200ms'         as many playouts as fit in 200 ms (also 't=1.5s')
+#   'mcts|5000|rollout|p=4' root parallelism: 4 processes search independently, root visits are summed
+# The tree lives in a NodePool (one flat array per field, nodes are indices) and is kept between the moves of a
+# game, re-rooted at the new position when it is one of the tree's nodes.
+
+DEFAULT_PLAYOUTS = 1000
+EXPLORATION = 1.4 # UCT constant, about sqrt(2) for rewards in [0, 1]
+PASS = -1 # move code of a pass
+UNEXPANDED = -1 # first_child of a node whose children are not created yet
+TERMINAL = -2 # first_child of a node where the game is over
+ROLLOUT_POLICIES = ['rollout']
+
+
+class NodePool:
+    """
+    All nodes of a tree in flat typed arrays. Children of a node are created together, so they occupy
+    first_child[node] .. first_child[node] + num_children[node] - 1. wins[node] counts from the point of view
+    of the player who made the move leading to node (a draw counts 1/2).
+    """
+    def __init__(self):
+        self.parent = array('i')
+        self.first_child = array('i')
+        self.num_children = array('H')
+        self.move = array('i')
+        self.visits = array('I')
+        self.wins = array('d')
+
+    def __len__(self):
+        return len(self.move)
+
+    def add(self, parent, move, visits=0, wins=0.0):
+        self.parent.append(parent)
+        self.first_child.append(UNEXPANDED)
+        self.num_children.append(0)
+        self.move.append(move)
+        self.visits.append(visits)
+        self.wins.append(wins)
+        return len(self.move) - 1
+
+    def bytes_per_node(self):
+        return sum(a.itemsize for a in (self.parent, self.first_child, self.num_children, self.move, self.visits, self.wins))
+
+    def children(self, node):
+        return range(self.first_child[node], self.first_child[node] + self.num_children[node])
+
+
+# ------------ game adapters ---------------
+# An adapter turns a game into immutable search states: player(state) is the player to move, moves(state) lists
+# move codes (empty when the game is over, [PASS] when the player to move must pass), play(state, move) returns the
+# next state and rollout plays randomly to the end and returns the winner (BLACK, WHITE or EMPTY for a draw).
+
+class BitboardAdapter:
+    # normal Othello on python-int bitboards, state = (black, white, player)
+    def __init__(self, dim):
+        self.dim = dim
+
+    def root_state(self, game):
+        return bb.pack(game.board, BLACK), bb.pack(game.board, WHITE), game.current_player
+
+    def key(self, state):
+        return state
+
+    def player(self, state):
+        return state[2]
+
+    def export(self, state): # picklable form for worker processes
+        return state
+
+    def load(self, exported):
+        return exported
+
+    def moves(self, state):
+        black, white, player = state
+        own, opp = (black, white) if player == BLACK else (white, black)
+        moves = bb.legal_moves(own, opp, self.dim)
+        if moves:
+            return list(self.indices(moves))
+        if bb.legal_moves(opp, own, self.dim):
+            return [PASS]
+        return []
+
+    @staticmethod
+    def indices(bits):
+        while bits:
+            low = bits & -bits
+            yield low.bit_length() - 1
+            bits ^= low
+
+    def play(self, state, move):
+        black, white, player = state
+        if move != PASS:
+            own, opp = (black, white) if player == BLACK else (white, black)
+            flipped = bb.flips(own, opp, move, self.dim)
+            own |= flipped | (1 << move)
+            opp &= ~flipped
+            black, white = (own, opp) if player == BLACK else (opp, own)
+        return black, white, opposite(player)
+
+    def rollout(self, state, rng):
+        black, white, player = state
+        own, opp = (black, white) if player == BLACK else (white, black)
+        passes = 0
+        while passes < 2:
+            moves = bb.legal_moves(own, opp, self.dim)
+            if moves:
+                passes = 0
+                for _ in range(rng.randrange(moves.bit_count())): # drop the lowest bits to reach a random one
+                    moves &= moves - 1
+                index = (moves & -moves).bit_length() - 1
+                flipped = bb.flips(own, opp, index, self.dim)
+                own |= flipped | (1 << index)
+                opp &= ~flipped
+            else:
+                passes += 1
+            own, opp = opp, own
+            player = opposite(player)
+        black, white = (own, opp) if player == BLACK else (opp, own)
+        return winner(black.bit_count(), white.bit_count())
+
+    def decode(self, move):
+        return divmod(move, self.dim)
+
+
+class KingAdapter:
+    # KingOthello, state = a KingOthello object that is never modified once created
+    # moves are coded as (x * dim + y) * 2 + is_king
+    def __init__(self, dim):
+        self.dim = dim
+
+    def root_state(self, game):
+        state = deepcopy(game)
+        state.rng = None # states are shared by the tree, the search supplies its own rng
+        state.mcts_engine = None
+        return state
+
+    def player(self, state):
+        return state.current_player
+
+    def key(self, state):
+        return (state.board.tobytes(), state.current_player, state.black_king_remain, state.white_king_remain)
+
+    def export(self, state):
+        return (state.board.copy(), state.current_player, state.black_king_remain, state.white_king_remain,
+                state.black_king_thres, state.white_king_thres)
+
+    def load(self, exported):
+        state = KingOthello()
+        (state.board, state.current_player, state.black_king_remain, state.white_king_remain,
+         state.black_king_thres, state.white_king_thres) = exported
+        state.rng = None
+        return state
+
+    def moves(self, state):
+        moves = state.find_all_valid_moves()
+        if moves:
+            return [(x * self.dim + y) * 2 + int(is_king) for x, y, is_king in moves]
+        state.switch_turn()
+        opponent_moves = state.find_all_valid_moves()
+        state.switch_turn()
+        return [PASS] if opponent_moves else []
+
+    def play(self, state, move):
+        child = deepcopy(state)
+        if move != PASS:
+            x, y, is_king = self.decode(move)
+            child.take_move(x, y, is_king)
+        child.switch_turn()
+        return child
+
+    def rollout(self, state, rng):
+        game = deepcopy(state)
+        passes = 0
+        while passes < 2:
+            moves = game.find_all_valid_moves()
+            if moves:
+                passes = 0
+                game.take_move(*rng.choice(moves))
+            else:
+                passes += 1
+            game.switch_turn()
+        net = game.finish_count(print_each_game_final=False)
+        return BLACK if net > 0 else WHITE if net < 0 else EMPTY
+
+    def decode(self, move):
+        square, is_king = divmod(move, 2)
+        x, y = divmod(square, self.dim)
+        return x, y, bool(is_king)
+
+
+def winner(num_black, num_white):
+    return BLACK if num_black > num_white else WHITE if num_black < num_white else EMPTY
+
+
+def make_adapter(game):
+    dim = game.board.shape[0]
+    return KingAdapter(dim) if isinstance(game, KingOthello) else BitboardAdapter(dim)
+
+
+# ------------ search ---------------
+
+class MCTS:
+    def __init__(self, adapter, rng=random, exploration=EXPLORATION):
+        self.adapter = adapter
+        self.rng = rng
+        self.exploration = exploration
+        self.pool = None
+        self.root_state = None
+        self.last_playouts = 0 # statistics of the last search
+        self.last_time = 0.0
+
+    def set_root(self, state):
+        # reuse the subtree of `state` when it is a child or grandchild of the current root, else start over
+        key = self.adapter.key(state)
+        if self.pool is not None:
+            frontier = [(0, self.root_state)]
+            for _ in range(2):
+                next_frontier = []
+                for node, node_state in frontier:
+                    if self.pool.first_child[node] < 0:
+                        continue
+                    for child in self.pool.children(node):
+                        child_state = self.adapter.play(node_state, self.pool.move[child])
+                        if self.adapter.key(child_state) == key:
+                            self.pool = self.extract_subtree(child)
+                            self.root_state = child_state
+                            return
+                        next_frontier.append((child, child_state))
+                frontier = next_frontier
+        self.pool = NodePool()
+        self.pool.add(-1, PASS)
+        self.root_state = state
+
+    def extract_subtree(self, node):
+        # copy the subtree under node into a new pool, node becomes the root (index 0)
+        old = self.pool
+        new = NodePool()
+        new.add(-1, old.move[node], old.visits[node], old.wins[node])
+        queue = deque([(node, 0)])
+        while queue:
+            old_node, new_node = queue.popleft()
+            if old.first_child[old_node] < 0:
+                new.first_child[new_node] = old.first_child[old_node]
+                continue
+            first = len(new)
+            for child in old.children(old_node):
+                new.add(new_node, old.move[child], old.visits[child], old.wins[child])
+            new.first_child[new_node] = first
+            new.num_children[new_node] = old.num_children[old_node]
+            for i, child in enumerate(old.children(old_node)):
+                queue.append((child, first + i))
+        return new
+
+    def expand(self, node, state):
+        moves = self.adapter.moves(state)
+        if not moves:
+            self.pool.first_child[node] = TERMINAL
+            return
+        first = len(self.pool)
+        for move in moves:
+            self.pool.add(node, move)
+        self.pool.first_child[node] = first
+        self.pool.num_children[node] = len(moves)
+
+    def select_child(self, node):
+        # UCT, unvisited children first
+        pool = self.pool
+        log_visits = math.log(pool.visits[node])
+        best, best_value = -1, -1.0
+        for child in pool.children(node):
+            visits = pool.visits[child]
+            if visits == 0:
+                return child
+            value = pool.wins[child] / visits + self.exploration * math.sqrt(log_visits / visits)
+            if value > best_value:
+                best, best_value = child, value
+        return best
+
+    def playout(self):
+        pool = self.pool
+        node, state = 0, self.root_state
+        path = [(0, None)] # (node, player who moved into it)
+        while pool.first_child[node] >= 0:
+            if pool.visits[node] == 0 and node != 0:
+                break # play out from a leaf before expanding it
+            mover = self.adapter.player(state)
+            node = self.select_child(node)
+            state = self.adapter.play(state, pool.move[node])
+            path.append((node, mover))
+        if pool.first_child[node] == UNEXPANDED and (pool.visits[node] > 0 or node == 0):
+            self.expand(node, state)
+            if pool.first_child[node] >= 0:
+                mover = self.adapter.player(state)
+                node = pool.first_child[node]
+                state = self.adapter.play(state, pool.move[node])
+                path.append((node, mover))
+        result = self.adapter.rollout(state, self.rng)
+        for node, mover in path:
+            pool.visits[node] += 1
+            if result == mover:
+                pool.wins[node] += 1.0
+            elif result == EMPTY:
+                pool.wins[node] += 0.5
+
+    def search(self, playouts=None, time_limit=None):
+        # run playouts from the current root until the playout count or the time limit (seconds) is reached
+        start = time.perf_counter()
+        done = 0
+        while True:
+            if playouts is not None and done >= playouts:
+                break
+            if time_limit is not None and time.perf_counter() - start >= time_limit:
+                break
+            self.playout()
+            done += 1
+        self.last_playouts = done
+        self.last_time = time.perf_counter() - start
+
+    def root_visits(self):
+        # {move code: visits} of the root's children
+        if self.pool.first_child[0] < 0:
+            return {}
+        return {self.pool.move[child]: self.pool.visits[child] for child in self.pool.children(0)}
+
+    def best_move(self):
+        # most visited root move, decoded for take_move, None when there is nothing to play
+        visits = self.root_visits()
+        moves = [move for move in visits if move != PASS]
+        if not moves:
+            return None
+        return self.adapter.decode(max(moves, key=visits.get))
+
+
+def parse_strategy(strategy):
+    # 'mcts|5000|rollout|p=4' -> (playouts, time_limit, policy, processes)
+    params = strategy.split('|')
+    if params[0] != 'mcts':
+        raise ValueError('not an mcts strategy: %r' % strategy)
+    playouts, time_limit, policy, processes = None, None, 'rollout', 1
+    for param in params[1:]:
+        if param.isdigit():
+            playouts = int(param)
+        elif param.startswith('t='):
+            value = param[2:]
+            time_limit = float(value[:-2]) / 1000 if value.endswith('ms') else float(value.rstrip('s'))
+        elif param.startswith('p='):
+            processes = int(param[2:])
+        elif param in ROLLOUT_POLICIES:
+            policy = param
+        else:
+            raise ValueError('unknown mcts parameter %r in %r' % (param, strategy))
+    if playouts is None and time_limit is None:
+        playouts = DEFAULT_PLAYOUTS
+    return playouts, time_limit, policy, processes
+
+
+in_pool_worker = False # set by mark_pool_worker in the workers of other process pools
+
+
+def mark_pool_worker():
+    # initializer for process pools whose workers may play MCTS (the server's): they search serially, root
+    # parallelism there would start a pool of its own in every worker
+    global in_pool_worker
+    in_pool_worker = True
+
+
+WORKER_POOLS = {} # (pid, processes) -> executor, kept so that root-parallel searches do not start processes every
+                 # move; keyed by pid so that a forked child never uses the pool it inherited from its parent
+
+
+def worker_pool(processes):
+    key = (os.getpid(), processes)
+    if key not in WORKER_POOLS:
+        WORKER_POOLS[key] = ProcessPoolExecutor(processes)
+    return WORKER_POOLS[key]
+
+
+@atexit.register
+def shutdown_worker_pools():
+    for (pid, processes), pool in list(WORKER_POOLS.items()):
+        if pid == os.getpid():
+            pool.shutdown(cancel_futures=True)
+        del WORKER_POOLS[pid, processes]
+
+
+def search_in_worker(adapter, exported_state, playouts, time_limit, seed):
+    engine = MCTS(adapter, random.Random(seed))
+    engine.set_root(adapter.load(exported_state))
+    engine.search(playouts, time_limit)
+    return engine.root_visits(), engine.last_playouts
+
+
+def root_parallel_move(game, playouts, time_limit, processes):
+    # every process grows its own tree from the current position, the visit counts of the root moves are summed
+    adapter = make_adapter(game)
+    exported = adapter.export(adapter.root_state(game))
+    seeds = [game.rng.getrandbits(64) for _ in range(processes)]
+    per_process = None if playouts is None else -(-playouts // processes) # split the budget, rounding up
+    futures = [worker_pool(processes).submit(search_in_worker, adapter, exported, per_process, time_limit, seed)
+               for seed in seeds]
+    total = {}
+    for future in futures:
+        visits, _ = future.result()
+        for move, count in visits.items():
+            total[move] = total.get(move, 0) + count
+    moves = [move for move in total if move != PASS]
+    if not moves:
+        return None
+    return adapter.decode(max(moves, key=total.get))
+
+
+def mcts_move(game, strategy='mcts|%d|rollout' % DEFAULT_PLAYOUTS):
+    # the move chosen by MCTS for game.current_player, the tree is kept on the game for the next move
+    playouts, time_limit, policy, processes = parse_strategy(strategy)
+    if not game.find_all_valid_moves():
+        return None
+    # search serially in pool workers: multiprocessing.Pool workers (AI_vs_AI) are daemons, which may not start
+    # processes, and ProcessPoolExecutor workers (the server) are flagged by mark_pool_worker
+    if processes > 1 and not in_pool_worker and not multiprocessing.current_process().daemon:
+        return root_parallel_move(game, playouts, time_limit, processes)
+    engine = getattr(game, 'mcts_engine', None)
+    if engine is None or engine.rng is not game.rng:
+        engine = game.mcts_engine = MCTS(make_adapter(game), game.rng)
+    engine.set_root(engine.adapter.root_state(game))
+    engine.search(playouts, time_limit)
+    return engine.best_move()
@@ -1,7 +1,13 @@
 from othello import Othello, DIM, BLACK, WHITE, DIRECTIONS, EMPTY
 from othello import np, deepcopy, opposite, is_inbound, board
 from kingOthello import KingOthello, king, BLACK_KING, WHITE_KING
+import bitboard as bb
+from functools import lru_cache
+from eval_cache import EvalCache
 import random
+import json
+import os
+import time
 
 
 IN_LINE_WITH_ENEMY_KING_PENALTY = 100 # if you put a king in same line with enemy's king, your king is in danger
@@ -9,12 +15,20 @@ IN_LINE_WITH_ENEMY_KING_PENALTY = 100 # if you put a king in same line with enem
 KING_ON_BORDER_BONUS = 75 # if you first put king on a boarder, you have good possibility to control this border
 BASIC_KING_SCORE = 10 # A king piece has this basic score, as in pos_score_sum
 
-def shuffle_dict(old_dict : dict):
-    # shuffle the dictionary for a different order, or 'max' function will always return the same element
-    keys = list(old_dict.keys())
-    random.shuffle(keys)
-    shuffled_dict = {key: old_dict[key] for key in keys}
-    return shuffled_dict
+def best_by_score(move_eval_dict : dict, maximize=True, rng=random):
+    # the move with max (or min) score, ties are broken uniformly at random with rng, or 'max' would always return the same element
+    # reservoir sampling over the ties, so no shuffled copy of the dict is needed
+    best_move = None
+    num_ties = 0
+    for move, score in move_eval_dict.items():
+        if best_move is None or (score > best_score if maximize else score < best_score):
+            best_move, best_score = move, score
+            num_ties = 1
+        elif score == best_score:
+            num_ties += 1
+            if rng.randrange(num_ties) == 0:
+                best_move = move
+    return best_move
 
 
 # ------------ Minimax part ---------------
@@ -28,51 +42,209 @@ pos_score_map = [120, -20,  20,   5,   5,  20, -20, 120,
      -20, -40,  -5,  -5,  -5,  -5, -40, -20,
      120, -20,  20,   5,   5,  20, -20, 120]
 
-pos_score_map = np.array(pos_score_map).reshape(DIM, DIM)
+pos_score_map = np.array(pos_score_map).reshape(8, 8)
+
+@lru_cache(maxsize=None)
+def position_weights(dim):
+    # pos_score_map stretched to a dim x dim board: the three outer rows and columns on each side keep their
+    # 8x8 weights (corners, X and C squares, edges) and the middle ones repeat the centre, so dim = 8 gives the map itself
+    # every row is mapped by its distance to the nearest edge, so the table stays symmetric on any size (4x4 too)
+    index = [min(i, dim - 1 - i, 3) if i < dim / 2 else 7 - min(dim - 1 - i, 3) for i in range(dim)]
+    weights = pos_score_map[np.ix_(index, index)]
+    weights.setflags(write=False) # shared by every caller
+    return weights
 
 def pos_score_sum(board):
     # sum of positional score
     # defined as (Σ black - Σ white), black tries to maximize while white minimizes
-    sum_black = 0
-    sum_white = 0
-    for i in range(DIM):
-        for j in range(DIM):
-            if board[i, j] == BLACK:
-                sum_black += pos_score_map[i, j]
-            elif board[i, j] == WHITE:
-                sum_white += pos_score_map[i, j]
-            elif board[i,j] == BLACK_KING:
-                sum_black += pos_score_map[i, j] + BASIC_KING_SCORE
-            elif board[i,j] == WHITE_KING:
-                sum_white += pos_score_map[i, j] + BASIC_KING_SCORE
+    weights = position_weights(board.shape[0])
+    sum_black = weights[board == BLACK].sum() + (weights[board == BLACK_KING] + BASIC_KING_SCORE).sum()
+    sum_white = weights[board == WHITE].sum() + (weights[board == WHITE_KING] + BASIC_KING_SCORE).sum()
     return  sum_black - sum_white
 
 
-def mobility(board):
+def mobility_features(board, player=None, player_moves=None):
+    # legal moves, potential mobility and frontier discs of both colors, computed in one pass on packed bitboards
+    # potential mobility: empty squares next to an enemy piece; frontier discs: own pieces next to an empty square
+    # if the search already generated the move list of `player` in this position, pass it to skip that side
+    # returns ((black_moves, white_moves), (black_potential, white_potential), (black_frontier, white_frontier))
+    dim = board.shape[0]
+    black = bb.pack(board, BLACK)
+    white = bb.pack(board, WHITE)
+    full = bb.board_masks(dim)[0]
+    empty = full & ~bb.pack(board != EMPTY, True) # kings on King Othello boards are neither black, white nor empty
+    if player == BLACK and player_moves is not None:
+        black_moves = len(player_moves)
+    else:
+        black_moves = bb.legal_moves(black, white, dim, empty).bit_count()
+    if player == WHITE and player_moves is not None:
+        white_moves = len(player_moves)
+    else:
+        white_moves = bb.legal_moves(white, black, dim, empty).bit_count()
+    next_to_empty = bb.neighbours(empty, dim)
+    black_potential = (empty & bb.neighbours(white, dim)).bit_count()
+    white_potential = (empty & bb.neighbours(black, dim)).bit_count()
+    return ((black_moves, white_moves), (black_potential, white_potential),
+            ((black & next_to_empty).bit_count(), (white & next_to_empty).bit_count()))
+
+
+def mobility(board, player=None, player_moves=None):
     # defined number of possible moves : black - white
-    g1 = Othello()
+    black_moves, white_moves = mobility_features(board, player, player_moves)[0]
+    return black_moves - white_moves
+
+
+def mobility_by_game(board):
+    # original mobility: builds a game object and scans every square for both colors, kept as a reference for benchmarks
+    g1 = Othello(dim=board.shape[0])
     g1.board = board
     g1.current_player = BLACK
-    score_black = len(g1.find_all_valid_moves())
+    score_black = len(g1.scan_valid_moves())
     g1.current_player = WHITE
-    score_white = len(g1.find_all_valid_moves())
+    score_white = len(g1.scan_valid_moves())
     return score_black - score_white
 
 
+def potential_mobility(board):
+    # number of empty squares next to an enemy piece : black - white
+    black_potential, white_potential = mobility_features(board)[1]
+    return black_potential - white_potential
+
+
+def frontier_discs(board):
+    # frontier discs are easy to flip, so fewer is better : white - black
+    black_frontier, white_frontier = mobility_features(board)[2]
+    return white_frontier - black_frontier
+
+
 def pos_plus_mobi(board, multiplier=1):
     return pos_score_sum(board) + multiplier * mobility(board)
 
 
-def minimax(board, depth, player, alpha=-np.inf, beta=np.inf, eval_func='pos_score', king_version=False):
-    if depth == 0:
-        if eval_func == 'pos_score':
-            return pos_score_sum(board)
-        elif eval_func == 'mobi':
-            return mobility(board)
-        elif eval_func == 'pos_mobi':
-            return pos_plus_mobi(board)
-        elif eval_func == 'king_pos_score': # this is for King Othello
-            return king_pos_score_sum(board)
+def evaluate(board, eval_func):
+    # static evaluation of a leaf, black tries to maximize while white minimizes
+    if eval_func == 'pos_score':
+        return pos_score_sum(board)
+    elif eval_func == 'mobi':
+        return mobility(board)
+    elif eval_func == 'pos_mobi':
+        return pos_plus_mobi(board)
+    elif eval_func == 'pot_mobi':
+        return potential_mobility(board)
+    elif eval_func == 'frontier':
+        return frontier_discs(board)
+    elif eval_func == 'king_pos_score': # this is for King Othello
+        return king_pos_score_sum(board)
+    raise ValueError('unknown eval_func %r' % eval_func)
+
+
+# ------------ Selective search ---------------
+# minimax(..., selective={...}) turns on any of:
+#   'pvs'     : moves after the first are searched with a null window first, and re-searched with the full window
+#               only when they fail high (beat the current best)
+#   'lmr'     : late move reductions, moves after the first LMR_FULL_DEPTH_MOVES (in static order) are tried one ply
+#               shallower with a null window, and re-searched at full depth only when they fail high
+#   'probcut' : (Multi-)ProbCut, a shallow search predicts the deep value with deep ~ a * shallow + b, and the node
+#               is cut when the prediction is outside the window by PROBCUT_T standard deviations; the parameters come
+#               from calibrate.py, one set per (eval_func, depth, game stage)
+
+SELECTIVE_FEATURES = ['pvs', 'lmr', 'probcut']
+LMR_FULL_DEPTH_MOVES = 3
+LMR_MIN_DEPTH = 2 # only reduce when at least this many plies remain
+PROBCUT_T = 1.5
+PROBCUT_STAGE_SIZE = 16 # empty squares per game stage, every stage has its own ProbCut parameters
+                        # (and every board size: the same number of empties is another stage on a bigger board)
+PROBCUT_PARAMS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'probcut_params.json')
+probcut_params = {} # (eval_func, dim, depth, stage) -> (shallow_depth, a, b, sigma), ProbCut is off without them
+search_stats = {'nodes': 0} # minimax calls, for measuring how much selective search saves
+eval_cache = None # optional EvalCache used by every search of this process, see use_eval_cache
+search_deadline = None # time.perf_counter() value after which minimax raises SearchTimeout, see othello.deepening_move
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+def use_eval_cache(max_bytes=None, policy='lru'):
+    # turn on leaf evaluation caching for this process (max_bytes=None keeps the cache default), returns the cache
+    global eval_cache
+    eval_cache = EvalCache(policy=policy) if max_bytes is None else EvalCache(max_bytes, policy)
+    return eval_cache
+
+
+def game_stage(board):
+    return int(np.count_nonzero(board == EMPTY)) // PROBCUT_STAGE_SIZE
+
+
+def load_probcut_params(path=PROBCUT_PARAMS_FILE):
+    # read the parameters written by calibrate.py into probcut_params
+    with open(path) as f:
+        for entry in json.load(f):
+            # files written before parameters were per board size were fitted on 8x8 boards
+            probcut_params[(entry['eval_func'], entry.get('dim', DIM), entry['depth'], entry['stage'])] = \
+                (entry['shallow_depth'], entry['a'], entry['b'], entry['sigma'])
+
+
+def check_selective(selective, eval_func):
+    # validate the feature names, and make sure ProbCut has parameters for eval_func
+    for feature in selective or ():
+        if feature not in SELECTIVE_FEATURES:
+            raise ValueError('unknown selective search feature %r' % feature)
+    if selective and 'probcut' in selective:
+        if not any(key[0] == eval_func for key in probcut_params) and os.path.exists(PROBCUT_PARAMS_FILE):
+            load_probcut_params()
+        if not any(key[0] == eval_func for key in probcut_params):
+            raise ValueError('no ProbCut parameters for %r, run calibrate.py first' % eval_func)
+
+
+def order_moves(moves, dim):
+    # static move ordering for selective search: best squares of the position weights first
+    weights = position_weights(dim)
+    return sorted(moves, key=lambda move: -weights[move[0], move[1]])
+
+
+def probcut(board, depth, player, alpha, beta, eval_func, king_version):
+    # return a bound if the shallow search predicts a cutoff, else None
+    params = probcut_params.get((eval_func, board.shape[0], depth, game_stage(board)))
+    if params is None:
+        return None
+    shallow_depth, a, b, sigma = params
+    predicted = a * minimax(board, shallow_depth, player, alpha=-np.inf, beta=np.inf, eval_func=eval_func,
+                            king_version=king_version) + b
+    if beta != np.inf and predicted - PROBCUT_T * sigma >= beta:
+        return beta
+    if alpha != -np.inf and predicted + PROBCUT_T * sigma <= alpha:
+        return alpha
+    return None
+
+
+def search_child(board, depth, player, alpha, beta, eval_func, king_version, pv, selective, move_index):
+    # value of a child node (player is the side to move there), with PVS / LMR when selective asks for them
+    if selective and move_index > 0:
+        reduce = 'lmr' in selective and move_index >= LMR_FULL_DEPTH_MOVES and depth + 1 >= LMR_MIN_DEPTH
+        if reduce or 'pvs' in selective:
+            if player == WHITE and alpha != -np.inf: # parent is black and maximizes: can this move beat alpha?
+                eval = minimax(board, depth - reduce, player, alpha, alpha + 1, eval_func, king_version, None, selective)
+                if eval <= alpha:
+                    return eval
+            elif player == BLACK and beta != np.inf: # parent is white and minimizes: can this move go below beta?
+                eval = minimax(board, depth - reduce, player, beta - 1, beta, eval_func, king_version, None, selective)
+                if eval >= beta:
+                    return eval
+    return minimax(board, depth, player, alpha, beta, eval_func, king_version, pv, selective)
+
+
+def minimax(board, depth, player, alpha=-np.inf, beta=np.inf, eval_func='pos_score', king_version=False, pv=None,
+            selective=None):
+    # if pv is a list, it is filled with the principal variation (best line of moves, None for a pass) below this node
+    # selective: optional collection of SELECTIVE_FEATURES, see above
+    search_stats['nodes'] += 1
+    if search_deadline is not None and time.perf_counter() > search_deadline:
+        raise SearchTimeout()
+    if depth <= 0: # LMR can reduce a depth 1 child below zero
+        if eval_cache is not None:
+            return eval_cache.evaluate(board, eval_func, evaluate)
+        return evaluate(board, eval_func)
     if not king_version:
         game = Othello()
     else:
@@ -82,12 +254,22 @@ def minimax(board, depth, player, alpha=-np.inf, beta=np.inf, eval_func='pos_sco
     possible_moves = game.find_all_valid_moves()
 
     if possible_moves:
+        if selective:
+            if 'probcut' in selective:
+                bound = probcut(board, depth, player, alpha, beta, eval_func, king_version)
+                if bound is not None:
+                    return bound
+            possible_moves = order_moves(possible_moves, board.shape[0])
         if player == BLACK: # maximizing player
             max_eval = - np.inf
-            for move in possible_moves:
+            for index, move in enumerate(possible_moves):
                 game_copy = deepcopy(game)
-                game_copy.take_move(move[0], move[1])
-                eval = minimax(game_copy.board, depth-1, opposite(player), alpha, beta)
+                game_copy.take_move(*move)
+                child_pv = None if pv is None else []
+                eval = search_child(game_copy.board, depth-1, opposite(player), alpha, beta, eval_func, king_version,
+                                    child_pv, selective, index)
+                if pv is not None and eval > max_eval:
+                    pv[:] = [move] + child_pv
                 max_eval = max(max_eval, eval)
                 alpha = max(alpha, eval)
                 if beta <= alpha:
@@ -96,10 +278,14 @@ def minimax(board, depth, player, alpha=-np.inf, beta=np.inf, eval_func='pos_sco
 
         else: # WHITE, minimizing player
             min_eval = np.inf
-            for move in possible_moves:
+            for index, move in enumerate(possible_moves):
                 game_copy = deepcopy(game)
-                game_copy.take_move(move[0], move[1])
-                eval = minimax(game_copy.board, depth - 1, opposite(player), alpha, beta)
+                game_copy.take_move(*move)
+                child_pv = None if pv is None else []
+                eval = search_child(game_copy.board, depth - 1, opposite(player), alpha, beta, eval_func, king_version,
+                                    child_pv, selective, index)
+                if pv is not None and eval < min_eval:
+                    pv[:] = [move] + child_pv
                 min_eval = min(min_eval, eval)
                 beta = min(beta, eval)
                 if beta <= alpha:
@@ -110,7 +296,12 @@ def minimax(board, depth, player, alpha=-np.inf, beta=np.inf, eval_func='pos_sco
         game.switch_turn()
         possible_moves = game.find_all_valid_moves() # check whether opponent has moves
         if possible_moves:
-            return minimax(game.board, depth-1, opposite(player), alpha, beta) # hand over to opponent, nothing changed
+            child_pv = None if pv is None else []
+            eval = minimax(game.board, depth-1, opposite(player), alpha, beta, eval_func, king_version, child_pv,
+                           selective) # hand over to opponent, nothing changed
+            if pv is not None:
+                pv[:] = [None] + child_pv
+            return eval
         else: # the opponent has no moves either, game over
             return pos_score_sum(game.board)
 
@@ -123,25 +314,27 @@ def king_pos_score_sum(board):
     # but if a King is online with previous enemy king, it is in danger of being captured by enemy, so it has a IN_LINE_WITH_ENEMY_KING_PENALTY
 
     score = pos_score_sum(board)
+    dim = board.shape[0]
+    weights = position_weights(dim)
 
     def get_king_additional_score(i, j, player):
         score = 0
-        if i in [0,DIM-1] or j in [0, DIM-1]: # on border
+        if i in [0,dim-1] or j in [0, dim-1]: # on border
             score += KING_ON_BORDER_BONUS
         for direction in DIRECTIONS:
-            new_i, new_j = i + direction[0], j + direction[0]
-            while is_inbound(new_i, new_j) and board[new_i, new_j] in [player, king(player)]: # if self's piece
-                score += pos_score_map[new_i, new_j] # the king piece serves as a reinforce, so we add again of those pieces that king piece can protect
-                new_i, new_j = new_i + direction[0], new_j + direction[0] # proceed with this direction
+            new_i, new_j = i + direction[0], j + direction[1]
+            while is_inbound(new_i, new_j, dim) and board[new_i, new_j] in [player, king(player)]: # if self's piece
+                score += weights[new_i, new_j] # the king piece serves as a reinforce, so we add again of those pieces that king piece can protect
+                new_i, new_j = new_i + direction[0], new_j + direction[1] # proceed with this direction
             # out of bound, met enemy piece, or enemy king
-            if is_inbound(new_i, new_j): # if still in bound, means it encountered enemy pieces
+            if is_inbound(new_i, new_j, dim): # if still in bound, means it encountered enemy pieces
                 if board[new_i, new_j] == king(opposite(player)):
                     score -= IN_LINE_WITH_ENEMY_KING_PENALTY # avoid right in same line with enemy king (where the first piece after our row of pieces is an enemy king), as you might be turned
             # else: out of bound, just continue
         return score if player==BLACK else -score # black is maximizing player and white is minimizing
 
-    for i in range(DIM):
-        for j in range(DIM):
+    for i in range(dim):
+        for j in range(dim):
             if board[i,j] == BLACK_KING:
                 score += get_king_additional_score(i, j, BLACK)
             elif board[i,j] == WHITE_KING:
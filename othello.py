@@ -1,7 +1,12 @@
 import numpy as np
 import random
+import multiprocessing
 from copy import deepcopy
+from functools import wraps
+import os
+import time
 import minimax as mm
+import bitboard as bb
 
 
 EMPTY = 0
@@ -9,30 +14,113 @@ BLACK = 1
 WHITE = 2
 DIRECTIONS = [(-1,0),(-1,1),(-1,-1),(0,1),(0,-1),(1,0),(1,1),(1,-1)]
 
-DIM = 8 # 8x8 is normal Reversi
+DIM = 8 # 8x8 is normal Reversi, the default board size; every game can pick its own (dim=...)
+PROFILE_ENV = 'OTHELLO_PROFILE' # '1' or a JSON output path turns on profiling mode, see profiler.py
+profile_scope = [] # main_flow / minimax_move / AI_vs_AI calls that already decided whether to profile
+DEPTH_GROWTH = 4 # estimated cost of a minimax depth relative to the one before, for stopping iterative deepening
 
 def opposite(player: int):
     return BLACK if player == WHITE else WHITE
 
-def is_inbound(x, y):
+def is_inbound(x, y, dim=DIM):
     # decide whether a tuple in inside the board
-    return 0 <= x < DIM and 0 <= y < DIM
+    return 0 <= x < dim and 0 <= y < dim
+
+def parse_seconds(text):
+    # '200ms', '1.5s' or '1.5' -> seconds
+    return float(text[:-2]) / 1000 if text.endswith('ms') else float(text.rstrip('s'))
+
+def deepening_move(game, deadline, depth=1, **kwargs):
+    # minimax_move at depth 0, 1, ..., depth; the next depth only starts when its estimated time (DEPTH_GROWTH times
+    # the last one) fits before the deadline, and a depth still running at the deadline is abandoned
+    # (depth 0 always finishes, so there is a move): (move of the deepest search done, whether it stopped before depth)
+    for current in range(depth + 1):
+        start = time.perf_counter()
+        previous_deadline = mm.search_deadline
+        mm.search_deadline = deadline if current > 0 else None
+        try:
+            move = game.minimax_move(depth=current, **kwargs)
+        except mm.SearchTimeout:
+            return move, True
+        finally:
+            mm.search_deadline = previous_deadline
+        now = time.perf_counter()
+        if current < depth and deadline is not None and now + (now - start) * DEPTH_GROWTH > deadline:
+            return move, True
+    return move, False
+
+def profile_setting(profile):
+    # profile argument, falling back to the environment variable when it is None; False when profiling is off
+    if profile is None:
+        profile = os.environ.get(PROFILE_ENV, '')
+    return False if profile in ('', '0') else profile
+
+def profiled(method):
+    # adds profile=None to main_flow and minimax_move, see profiler.py; calls made inside an outer one do not
+    # decide again, so a game does not report every move separately
+    @wraps(method)
+    def wrapper(self, *args, profile=None, **kwargs):
+        if profile_scope:
+            return method(self, *args, **kwargs)
+        profile_scope.append(method.__name__)
+        try:
+            profile = profile_setting(profile)
+            if not profile:
+                return method(self, *args, **kwargs)
+            import profiler # imported here: profiler needs this module fully loaded
+            with profiler.profiling(profile):
+                return method(self, *args, **kwargs)
+        finally:
+            profile_scope.pop()
+    return wrapper
 
 class Othello:
-    def __init__(self):
-        self.board = np.full((DIM, DIM), EMPTY) # initialize board
+    def __init__(self, seed=None, rng=None, dim=DIM):
+        # rng: any object with choice/randrange (e.g. random.Random), used for random moves and tie-breaks
+        # if neither is given, the global random module is used as before
+        # dim: board size, any even number >= 4, with the usual four pieces in the centre
+        if dim < 4 or dim % 2:
+            raise ValueError('board size must be an even number >= 4, got %r' % dim)
+        if rng is None:
+            rng = random.Random(seed) if seed is not None else random
+        self.rng = rng
+        self.history = [] # moves played through main_flow
+        self.mcts_engine = None # MCTS tree kept between moves, see mcts.py
+        self.board = np.full((dim, dim), EMPTY) # initialize board
         self.current_player = BLACK
-        self.board[3,3] = BLACK; self.board[4,4] = BLACK
-        self.board[3,4] = WHITE; self.board[4,3] = WHITE
+        center = dim // 2
+        self.board[center-1,center-1] = BLACK; self.board[center,center] = BLACK
+        self.board[center-1,center] = WHITE; self.board[center,center-1] = WHITE
+        self.moves_cache = {} # legal moves of each player for the current board, cleared by take_move
+        self.moves_cache_board = self.board
+
+    def __deepcopy__(self, memo):
+        # copies made during search share the rng with the original and do not carry the MCTS tree,
+        # everything else is copied as usual
+        game_copy = self.__class__.__new__(self.__class__)
+        memo[id(self)] = game_copy
+        for key, value in self.__dict__.items():
+            if key == 'mcts_engine':
+                value = None
+            elif key != 'rng':
+                value = deepcopy(value, memo)
+            setattr(game_copy, key, value)
+        return game_copy
+
+    @property
+    def dim(self):
+        # board size, read from the board since searches and loaders replace self.board
+        return self.board.shape[0]
 
     def is_valid_move(self, x, y):
-        if is_inbound(x,y) and self.board[x,y] == EMPTY:
+        dim = self.dim
+        if is_inbound(x,y,dim) and self.board[x,y] == EMPTY:
             for direction in DIRECTIONS:
                 new_x, new_y = x + direction[0], y + direction[1]
-                if is_inbound(new_x, new_y) and self.board[new_x, new_y] == opposite(self.current_player): # make sure >= 1 opposite
-                    while is_inbound(new_x, new_y) and self.board[new_x, new_y] == opposite(self.current_player):
+                if is_inbound(new_x, new_y, dim) and self.board[new_x, new_y] == opposite(self.current_player): # make sure >= 1 opposite
+                    while is_inbound(new_x, new_y, dim) and self.board[new_x, new_y] == opposite(self.current_player):
                         new_x, new_y = new_x + direction[0], new_y + direction[1]
-                    if is_inbound(new_x, new_y) and self.board[new_x, new_y] == self.current_player:
+                    if is_inbound(new_x, new_y, dim) and self.board[new_x, new_y] == self.current_player:
                         return True # find one valid is enough
             return False
         else:
@@ -40,17 +128,19 @@ class Othello:
 
 
     def take_move(self, x, y):
+        dim = self.dim
         if self.is_valid_move(x,y):
+            self.moves_cache = {}
             self.board[x, y] = self.current_player
             pieces_to_reverse = []
             for direction in DIRECTIONS:
                 new_x, new_y = x + direction[0], y + direction[1]
                 temp_list = [] # temp storage for each direction
-                if is_inbound(new_x, new_y) and self.board[new_x, new_y] == opposite(self.current_player):
-                    while is_inbound(new_x, new_y) and self.board[new_x, new_y] == opposite(self.current_player):
+                if is_inbound(new_x, new_y, dim) and self.board[new_x, new_y] == opposite(self.current_player):
+                    while is_inbound(new_x, new_y, dim) and self.board[new_x, new_y] == opposite(self.current_player):
                         temp_list.append((new_x, new_y))
                         new_x, new_y = new_x + direction[0], new_y + direction[1]
-                    if is_inbound(new_x, new_y) and self.board[new_x, new_y] == self.current_player: # valid direction
+                    if is_inbound(new_x, new_y, dim) and self.board[new_x, new_y] == self.current_player: # valid direction
                         pieces_to_reverse.extend(temp_list) # move to final container
             for coord in pieces_to_reverse:
                 self.board[coord[0], coord[1]] = self.current_player
@@ -64,9 +154,30 @@ class Othello:
 
     def find_all_valid_moves(self):
         # find all possible moves, return in form of: a list of tuples
+        # the list is cached per player until the next take_move, so callers must not modify it
+        if self.moves_cache_board is not self.board: # board was replaced from outside, e.g. in minimax
+            self.moves_cache = {}
+            self.moves_cache_board = self.board
+        valid_moves = self.moves_cache.get(self.current_player)
+        if valid_moves is None:
+            valid_moves = self.generate_valid_moves()
+            self.moves_cache[self.current_player] = valid_moves
+        return valid_moves
+
+
+    def generate_valid_moves(self):
+        # legal moves of the current player from bitboards, without looking at the cache
+        # same row-major order as scanning every square, but O(8 * dim) big-int operations instead of O(dim^3) lookups
+        own = bb.pack(self.board, self.current_player)
+        opp = bb.pack(self.board, opposite(self.current_player))
+        return bb.unpack(bb.legal_moves(own, opp, self.dim), self.dim)
+
+
+    def scan_valid_moves(self):
+        # original move generation: is_valid_move on every square, kept as a reference for benchmarks
         valid_moves = []
-        for i in range(DIM):
-            for j in range(DIM):
+        for i in range(self.dim):
+            for j in range(self.dim):
                 if self.is_valid_move(i,j):
                     valid_moves.append((i,j))
         return valid_moves
@@ -74,9 +185,10 @@ class Othello:
 
     def is_game_end(self):
         if not self.find_all_valid_moves(): # make sure 1st player has no valid moves
-            game_copy = deepcopy(self)
-            game_copy.switch_turn() # check whether the other player also has valid moves
-            return True if not game_copy.find_all_valid_moves() else False
+            self.switch_turn() # check whether the other player also has valid moves, both lists stay cached
+            opponent_moves = self.find_all_valid_moves()
+            self.switch_turn()
+            return not opponent_moves
         else:
             return False
 
@@ -117,6 +229,8 @@ class Othello:
                     move = self.random_move()
                 elif self.mode['ai'] == 'minimax':
                     move = self.minimax_move()
+                elif self.mode['ai'].startswith('mcts'):
+                    move = self.mcts_move(self.mode['ai'])
 
         # Mode2: AI vs AI
         elif self.mode['mode'] == 'machine-machine':
@@ -125,57 +239,85 @@ class Othello:
                 move = self.random_move()
             elif players_dict[player].find('minimax') != -1: # if contains 'minimax', then it's minimax family
                 # format: 'minimax|3|pos_score'  means depth=3, eval_func=pos_score
+                # optional selective search: 'minimax|3|pos_score|lmr+pvs+probcut', see minimax.py
+                # a time per move instead of a depth, 'minimax|t=200ms|pos_score', deepens until the time is used up
                 params = players_dict[player].split('|')
-                if len(params) == 3:
-                    depth = int(params[1])
+                if len(params) in [3, 4]:
                     eval_func = params[2]
-                    move = self.minimax_move(depth=depth, eval_func=eval_func )
+                    selective = params[3].split('+') if len(params) == 4 else None
+                    if params[1].startswith('t='):
+                        deadline = time.perf_counter() + parse_seconds(params[1][2:])
+                        max_depth = int(np.count_nonzero(self.board == EMPTY)) # deeper only repeats the same search
+                        move = deepening_move(self, deadline, max_depth, eval_func=eval_func, selective=selective)[0]
+                    else:
+                        move = self.minimax_move(depth=int(params[1]), eval_func=eval_func, selective=selective)
                 else: # use default
                     move = self.minimax_move()
+            elif players_dict[player].startswith('mcts'): # format: 'mcts|5000|rollout' or 'mcts|t=200ms', see mcts.py
+                move = self.mcts_move(players_dict[player])
         return move
 
 
     def random_move(self):
         valid_moves = self.find_all_valid_moves() # a list of current valid moves
         if valid_moves:
-            return random.choice(self.find_all_valid_moves())
+            return self.rng.choice(valid_moves)
         else:
             return None
 
 
-    def minimax_move(self, depth=1, eval_func='pos_score'):
+    def score_all_moves(self, depth=1, eval_func='pos_score', pvs=None, selective=None):
+        # minimax score of every valid move of the current player, in form of: {move: score}
+        # if pvs is a dict, it is filled with {move: principal variation that follows the move}
+        mm.check_selective(selective, eval_func)
+        move_eval_dict = {}
+        for move in self.find_all_valid_moves():
+            game_copy = deepcopy(self)
+            game_copy.take_move(move[0], move[1])
+            pv = None if pvs is None else []
+            move_eval_dict[move] = mm.minimax(game_copy.board, depth=depth, player=opposite(self.current_player),
+                                              eval_func=eval_func, pv=pv, selective=selective)
+            if pvs is not None:
+                pvs[move] = pv
+        return move_eval_dict
+
+
+    @profiled
+    def minimax_move(self, depth=1, eval_func='pos_score', selective=None):
         # return the move with max minimax score
         # minimax(board, depth, player, alpha, beta) -> int:
-        move_eval_dict = {}
         possible_moves = self.find_all_valid_moves()
         if possible_moves:
-            for move in possible_moves:
-                game_copy = deepcopy(self)
-                game_copy.take_move(move[0], move[1])
-                move_eval_dict[move] = mm.minimax(game_copy.board, depth=depth, player=opposite(self.current_player), eval_func=eval_func)
-
-            move_eval_dict = mm.shuffle_dict(move_eval_dict) # shuffle the dict, or always choose the same move
-            if self.current_player == BLACK:
-                return max(move_eval_dict, key=move_eval_dict.get) # return the move with max minimax score
-            else: # White is the minimizing player, the less the better.
-                return min(move_eval_dict, key=move_eval_dict.get)
+            move_eval_dict = self.score_all_moves(depth, eval_func, selective=selective)
+
+            # Black maximizes, White is the minimizing player, the less the better. Ties are broken with self.rng
+            return mm.best_by_score(move_eval_dict, maximize=(self.current_player == BLACK), rng=self.rng)
                 # Initially when I adapted from Sebestian's Youtube code, I forgot the above two lines
                 # and Black wins 95% even white uses minimax and black uses 'random'
         else:
             return None
 
 
+    def mcts_move(self, strategy='mcts|1000|rollout'):
+        # Monte Carlo Tree Search, the tree is kept in self.mcts_engine and reused for the next move
+        import mcts # imported here: mcts needs this module fully loaded
+        return mcts.mcts_move(self, strategy)
+
+
     # main game flow
+    @profiled
     def main_flow(self, game_mode='man-machine', human_first=True, ai_strategy='random',
                   black_strat='random', white_strat='random', print_board=True, print_each_game_final=True):
         self.mode = {'mode' : game_mode, 'human_first' : human_first, 'ai' : ai_strategy,'black_strat': black_strat, 'white_strat' : white_strat}
 
         while not self.is_game_end():
-            if self.find_all_valid_moves(): # if have valid moves for current player
+            valid_moves = self.find_all_valid_moves()
+            if valid_moves: # if have valid moves for current player
                 while True:
                     new_move = self.get_move(self.current_player) # request new move
-                    if self.is_valid_move(new_move[0], new_move[1]): # if entered a valid move
+                    if tuple(new_move) in valid_moves: # if entered a valid move
                         self.take_move(new_move[0], new_move[1])
+                        self.history.append(tuple(new_move))
                         self.switch_turn()
                         if print_board:
                             self.print_board() # print the game situation when a valid move is taken
@@ -208,21 +350,86 @@ def get_input():
     return (int(x), int(y)) # all moves takes the form of tuple
 
 
-def man_vs_AI(human_first=True, ai_strategy='minimax'):
-    # a high-level integration function for man_vs AI
+def man_vs_AI(human_first=True, ai_strategy='minimax', store=None):
+    # a high-level integration function for man_vs AI, store: optional game store directory, see game_store.py
     g1 = Othello()
-    g1.main_flow(game_mode='man-machine', human_first=human_first, ai_strategy=ai_strategy)
-
-
-def AI_vs_AI(num_game=100, black_strat='random', white_strat='random', print_each_game_final=True, print_game_summary=True):
-    # used for convenience in comparing the strength of different AIs for a specific number of game
+    res = g1.main_flow(game_mode='man-machine', human_first=human_first, ai_strategy=ai_strategy)
+    if store is not None:
+        save_games(store, [(res, g1.history)], 'human' if human_first else ai_strategy,
+                   ai_strategy if human_first else 'human', g1.dim)
+
+
+def save_games(store, results, black_strat, white_strat, dim=DIM):
+    # append finished games, (num_black - num_white, moves) each, to a game store directory
+    from game_store import GameStore # imported here: game_store needs this module fully loaded
+    with GameStore(store) as game_store:
+        game_store.add_games({'moves': moves, 'result': res, 'black': black_strat, 'white': white_strat, 'dim': dim}
+                             for res, moves in results)
+
+
+def play_seeded_game(args):
+    # one AI vs AI game, module level so that worker processes can run it: returns (num_black - num_white, moves)
+    game_seed, black_strat, white_strat, print_each_game_final, dim = args
+    g1 = Othello(seed=game_seed, dim=dim)
+    res = g1.main_flow(game_mode='machine-machine', black_strat=black_strat, white_strat=white_strat,
+                       print_board=False, print_each_game_final=print_each_game_final, profile=False)
+    return int(res), g1.history
+
+
+def AI_vs_AI(num_game=100, black_strat='random', white_strat='random', print_each_game_final=True, print_game_summary=True,
+             seed=None, workers=1, records=None, eval_cache_bytes=None, dim=DIM, store=None,
+             profile=None):
+    """
+    used for convenience in comparing the strength of different AIs for a specific number of game
+    :param seed: if given, game i always gets the same seed, so serial and parallel runs play identical games
+                 (without it, game seeds come from the global random module)
+    :param workers: number of processes to spread the games over
+    :param records: if a list, (num_black - num_white, list of moves) of every game is appended to it, in game order
+    :param eval_cache_bytes: if given, the games of this call cache leaf evaluations up to about this size per process,
+                             see eval_cache.py; the cache is gone when the call returns
+    :param dim: board size of every game
+    :param store: if given, a game store directory every game is appended to, see game_store.py
+    :param profile: True or a JSON output path prints a breakdown of where the time went, summed over all processes;
+                    None falls back to the OTHELLO_PROFILE environment variable, see profiler.py
+    """
     black_wins = 0
     white_wins = 0
 
-    for i in range(num_game):
-        g1 = Othello()
-        res = g1.main_flow(game_mode='machine-machine', black_strat=black_strat, white_strat=white_strat,
-                           print_board=False, print_each_game_final=print_each_game_final)
+    # every game gets its own seed, drawn up front, so the games do not depend on which process plays them
+    seed_rng = random.Random(seed) if seed is not None else random
+    game_seeds = [seed_rng.getrandbits(64) for _ in range(num_game)]
+    tasks = [(game_seed, black_strat, white_strat, print_each_game_final, dim)
+             for game_seed in game_seeds]
+    profile = False if profile_scope else profile_setting(profile)
+    play = play_seeded_game
+    if profile:
+        import profiler # imported here: profiler needs this module fully loaded
+        play = profiler.play_profiled_game
+    if workers > 1:
+        # every worker gets one cache for all the games it plays, it goes away with the pool
+        initializer, initargs = (mm.use_eval_cache, (eval_cache_bytes,)) if eval_cache_bytes else (None, ())
+        with multiprocessing.Pool(workers, initializer, initargs) as pool:
+            results = pool.map(play, tasks)
+    else:
+        previous_cache = mm.eval_cache
+        if eval_cache_bytes:
+            mm.use_eval_cache(eval_cache_bytes)
+        try:
+            results = list(map(play, tasks))
+        finally:
+            mm.eval_cache = previous_cache
+    if profile: # every game brings the counters of its process, add them up
+        total = profiler.Profiler()
+        for res, moves, snapshot in results:
+            total.merge(snapshot)
+        results = [(res, moves) for res, moves, snapshot in results]
+        total.report(profile)
+    if store is not None:
+        save_games(store, results, black_strat, white_strat, dim)
+
+    for res, moves in results:
+        if records is not None:
+            records.append((res, moves))
         if res > 0:
             black_wins += 1
         elif res < 0:
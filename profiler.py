@@ -0,0 +1,186 @@
+import minimax as mm
+import othello
+import bitboard as bb
+from kingOthello import KingOthello
+from eval_cache import EvalCache
+from contextlib import contextmanager
+from functools import wraps
+import argparse
+import json
+import time
+
+# Profiling mode for games and searches.
+# While a Profiler is enabled, every hot path in HOT_PATHS is replaced by a timed wrapper that counts calls,
+# inclusive time (of the outermost call only, so recursive searches are not counted twice) and self time (inclusive
+# time minus the time of the timed calls made inside it). Nothing is replaced while it is disabled, so the normal
+# code paths cost exactly what they did.
+# Turn it on with profile=True (or a JSON output path) in Othello.main_flow, Othello.minimax_move and AI_vs_AI,
+# with the OTHELLO_PROFILE environment variable ('1' or a JSON output path), or from the command line:
+#   python profiler.py -n 4 -b 'minimax|3|pos_mobi' -w random --workers 2 --json profile.json
+
+HOT_PATHS = [ # (class or module, attribute, phase)
+    (othello.Othello, 'get_move', 'move'),
+    (othello.Othello, 'minimax_move', 'minimax_move'),
+    (othello.Othello, 'mcts_move', 'mcts_move'),
+    (othello.Othello, 'random_move', 'random_move'),
+    (othello.Othello, '__init__', 'Othello()'),
+    (othello.Othello, '__deepcopy__', 'deepcopy'),
+    (othello.Othello, 'is_valid_move', 'is_valid_move'),
+    (othello.Othello, 'take_move', 'take_move'),
+    (othello.Othello, 'find_all_valid_moves', 'find_all_valid_moves'),
+    (othello.Othello, 'generate_valid_moves', 'generate_valid_moves'),
+    (KingOthello, 'minimax_move', 'minimax_move'),
+    (KingOthello, 'is_valid_move', 'is_valid_move'),
+    (KingOthello, 'take_move', 'take_move'),
+    (KingOthello, 'generate_valid_moves', 'generate_valid_moves'),
+    (mm, 'minimax', 'minimax'),
+    (mm, 'probcut', 'probcut'),
+    (mm, 'order_moves', 'order_moves'),
+    (mm, 'evaluate', 'evaluate'),
+    (mm, 'pos_score_sum', 'pos_score_sum'),
+    (mm, 'mobility_features', 'mobility_features'),
+    (mm, 'king_pos_score_sum', 'king_pos_score_sum'),
+    (EvalCache, 'evaluate', 'eval_cache'),
+    (bb, 'pack', 'bb.pack'),
+    (bb, 'unpack', 'bb.unpack'),
+    (bb, 'legal_moves', 'bb.legal_moves'),
+]
+ROOT_PHASE = 'move' # shares are relative to the time spent choosing moves, or to the profiled wall time without it
+
+active = None # the enabled Profiler of this process
+
+
+class Profiler:
+    def __init__(self):
+        self.stats = {} # phase -> [calls, outermost calls, inclusive seconds, self seconds]
+        self.wall = 0.0 # seconds spent enabled
+        self.children = [0.0] # timed callee seconds of every open timed call, innermost last
+        self.originals = [] # (owner, attribute, original value) while enabled
+        self.started = None
+
+    def timed(self, phase, func):
+        record = self.stats.setdefault(phase, [0, 0, 0.0, 0.0])
+        children = self.children
+        open_calls = [0] # recursion depth of this wrapper
+        clock = time.perf_counter
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            open_calls[0] += 1
+            children.append(0.0)
+            start = clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = clock() - start
+                open_calls[0] -= 1
+                record[0] += 1
+                record[3] += elapsed - children.pop()
+                children[-1] += elapsed
+                if not open_calls[0]:
+                    record[1] += 1
+                    record[2] += elapsed
+        return wrapper
+
+    def enable(self):
+        global active
+        if self.originals:
+            return
+        for owner, attribute, phase in HOT_PATHS:
+            original = vars(owner)[attribute] # only what the owner defines itself, not what a subclass inherits
+            self.originals.append((owner, attribute, original))
+            setattr(owner, attribute, self.timed(phase, original))
+        self.started = time.perf_counter()
+        active = self
+
+    def disable(self):
+        global active
+        if not self.originals:
+            return
+        self.wall += time.perf_counter() - self.started
+        for owner, attribute, original in reversed(self.originals):
+            setattr(owner, attribute, original)
+        self.originals = []
+        if active is self:
+            active = None
+
+    def snapshot(self):
+        # picklable copy of the counters, for sending them from a worker process to merge
+        wall = self.wall + (time.perf_counter() - self.started if self.originals else 0.0)
+        return {'wall': wall, 'stats': {phase: list(record) for phase, record in self.stats.items() if record[0]}}
+
+    def merge(self, snapshot):
+        self.wall += snapshot['wall']
+        for phase, counters in snapshot['stats'].items():
+            record = self.stats.setdefault(phase, [0, 0, 0.0, 0.0])
+            for i, value in enumerate(counters):
+                record[i] += value
+
+    def summary(self):
+        # {'move_time': seconds, 'wall': seconds, 'phases': {phase: {...}}}, phases by decreasing self time
+        snapshot = self.snapshot()
+        stats = snapshot['stats']
+        move_time = stats[ROOT_PHASE][2] if ROOT_PHASE in stats else snapshot['wall']
+        phases = {}
+        for phase, (calls, outer_calls, total, own) in sorted(stats.items(), key=lambda item: -item[1][3]):
+            phases[phase] = {'calls': calls, 'total': total, 'mean': total / outer_calls, 'self': own,
+                             'share': total / move_time if move_time else 0.0,
+                             'self_share': own / move_time if move_time else 0.0}
+        return {'move_time': move_time, 'wall': snapshot['wall'], 'phases': phases}
+
+    def text(self):
+        summary = self.summary()
+        lines = ['profiled %.3fs, %.3fs choosing moves (share = share of that time; total and share include callees,'
+                 ' mean is per outermost call)' % (summary['wall'], summary['move_time']),
+                 '%-22s %10s %10s %11s %10s %7s %7s' % ('phase', 'calls', 'total s', 'mean us', 'self s', 'share',
+                                                        'self')]
+        for phase, row in summary['phases'].items():
+            lines.append('%-22s %10d %10.3f %11.1f %10.3f %6.1f%% %6.1f%%'
+                         % (phase, row['calls'], row['total'], row['mean'] * 1e6, row['self'], row['share'] * 100,
+                            row['self_share'] * 100))
+        return '\n'.join(lines)
+
+    def report(self, output=True):
+        # print the text breakdown; output other than True / '1' is a path the JSON summary is written to
+        print(self.text())
+        if isinstance(output, str) and output != '1':
+            with open(output, 'w') as f:
+                json.dump(self.summary(), f, indent=1)
+
+
+@contextmanager
+def profiling(output=True, report=True):
+    # profile the block with a fresh Profiler and report it at the end; inside an enabled one, just use that one
+    if active is not None:
+        yield active
+        return
+    profiler = Profiler()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+    if report:
+        profiler.report(output)
+
+
+def play_profiled_game(args):
+    # othello.play_seeded_game under a Profiler of this process: returns (num_black - num_white, moves, snapshot)
+    with profiling(report=False) as profiler:
+        res, moves = othello.play_seeded_game(args)
+    return res, moves, profiler.snapshot()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Profile AI vs AI games')
+    parser.add_argument('-n', '--num-game', type=int, default=4)
+    parser.add_argument('-b', '--black', default='minimax|2|pos_mobi')
+    parser.add_argument('-w', '--white', default='random')
+    parser.add_argument('-s', '--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--dim', type=int, default=othello.DIM)
+    parser.add_argument('--json', help='also write the breakdown as JSON to this file')
+    args = parser.parse_args()
+
+    othello.AI_vs_AI(args.num_game, args.black, args.white, print_each_game_final=False, seed=args.seed,
+                     workers=args.workers, dim=args.dim, profile=args.json or True)
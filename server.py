@@ -0,0 +1,351 @@
+import minimax as mm
+from othello import Othello, DIM, EMPTY, deepening_move, parse_seconds
+from kingOthello import KingOthello
+import mcts
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import argparse
+import asyncio
+import json
+import os
+import time
+import uuid
+
+# Headless game server: many Othello / KingOthello sessions behind one asyncio TCP server.
+# Protocol: one JSON object per line in each direction, e.g.
+#   {"cmd": "new", "variant": "king", "strategy": "minimax|2|king_pos_score", "time_budget": 2.0, "size": 8}
+#   {"cmd": "move", "session": "...", "move": [2, 3]}       (KingOthello: [2, 3, true] places a king, [2, 3] or
+#                                                            [2, 3, false] a normal piece)
+#   {"cmd": "ai_move", "session": "..."}
+#   {"cmd": "state", "session": "..."}   {"cmd": "close", "session": "..."}   {"cmd": "stats"}
+# Every reply has "ok"; failures carry "error" instead of raising on the server side.
+# "time_budget" bounds each ai_move search from when a worker starts it: minimax gives up a depth that is still
+# running at the deadline and plays the best move of the last finished one ("timed_out": true), MCTS stops its
+# playouts; only the depth 0 search and a single playout run past it.
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_TIME_BUDGET = 5.0 # seconds an AI search may take, counted from when a worker starts it (not queue time)
+LATENCY_WINDOW = 10000 # latencies kept per command for percentiles
+
+
+def game_to_state(game):
+    # plain-json description of a game, used both for replies and for persistence
+    state = {'variant': 'king' if isinstance(game, KingOthello) else 'normal',
+             'board': game.board.tolist(), 'current_player': int(game.current_player)}
+    if isinstance(game, KingOthello):
+        state['black_king_remain'] = game.black_king_remain
+        state['white_king_remain'] = game.white_king_remain
+        state['black_king_thres'] = game.black_king_thres
+        state['white_king_thres'] = game.white_king_thres
+    return state
+
+
+def game_from_state(state):
+    game = KingOthello() if state['variant'] == 'king' else Othello()
+    game.board = np.array(state['board'])
+    game.current_player = state['current_player']
+    if state['variant'] == 'king':
+        game.black_king_remain = state['black_king_remain']
+        game.white_king_remain = state['white_king_remain']
+        game.black_king_thres = state['black_king_thres']
+        game.white_king_thres = state['white_king_thres']
+    return game
+
+
+def parse_strategy(strategy, game):
+    # ('random' | 'mcts' | 'minimax', minimax_move keyword arguments) of a strategy string, in AI_vs_AI's format;
+    # ValueError for anything ai_move could not play in game
+    if not isinstance(strategy, str):
+        raise ValueError('strategy must be a string, got %r' % (strategy,))
+    if strategy == 'random':
+        return 'random', {}
+    if strategy.startswith('mcts'):
+        mcts.parse_strategy(strategy)
+        return 'mcts', {}
+    params = strategy.split('|')
+    if params[0] != 'minimax' or len(params) not in [1, 3, 4] or (len(params) == 4 and isinstance(game, KingOthello)):
+        raise ValueError('unknown strategy %r, use random, minimax|depth|eval_func[|selective] (depth may be t=time per '
+                         'move) or mcts|...' % strategy)
+    if len(params) == 1:
+        return 'minimax', {}
+    if params[1].startswith('t='): # time per move, see Othello.get_move
+        if isinstance(game, KingOthello):
+            raise ValueError('no time per move for King Othello: %r' % strategy)
+        kwargs = {'time_limit': parse_seconds(params[1][2:]), 'eval_func': params[2]}
+    else:
+        kwargs = {'depth': int(params[1]), 'eval_func': params[2]}
+        if kwargs['depth'] < 0:
+            raise ValueError('negative depth in %r' % strategy)
+    mm.evaluate(game.board, params[2]) # ValueError for an unknown eval_func
+    if len(params) == 4:
+        kwargs['selective'] = params[3].split('+')
+        mm.check_selective(kwargs['selective'], params[2])
+    return 'minimax', kwargs
+
+
+def ai_move(game, strategy, deadline=None):
+    # pick a move for the current player with a strategy string: (move, whether the deadline cut the search short)
+    # minimax deepens iteratively up to its depth and MCTS without a time limit gets one, so both stop by the deadline
+    kind, kwargs = parse_strategy(strategy, game)
+    if kind == 'random':
+        return game.random_move(), False
+    if kind == 'mcts':
+        if deadline is not None and 't=' not in strategy:
+            strategy += '|t=%fs' % max(0.0, deadline - time.perf_counter())
+        return game.mcts_move(strategy), False
+    if 'time_limit' in kwargs: # the strategy's own time per move: only a shorter budget makes it a timeout
+        own_deadline = time.perf_counter() + kwargs.pop('time_limit')
+        max_depth = int(np.count_nonzero(game.board == EMPTY))
+        move, stopped_early = deepening_move(game, min(deadline or np.inf, own_deadline), max_depth, **kwargs)
+        return move, stopped_early and deadline is not None and deadline < own_deadline
+    return deepening_move(game, deadline, **kwargs)
+
+
+def search_in_worker(state, strategy, time_budget):
+    # runs in a pool process: rebuild the game from its state and search, the budget starts now
+    move, stopped_early = ai_move(game_from_state(state), strategy, time.perf_counter() + time_budget)
+    return None if move is None else [int(v) if not isinstance(v, bool) else v for v in move], stopped_early
+
+
+def percentile(values, q):
+    # nearest-rank percentile of an unsorted list
+    ordered = sorted(values)
+    rank = max(0, int(np.ceil(q / 100 * len(ordered))) - 1)
+    return ordered[rank]
+
+
+class Session:
+    def __init__(self, session_id, game, strategy, time_budget):
+        self.id = session_id
+        self.game = game
+        self.strategy = strategy
+        self.time_budget = time_budget
+        self.history = [] # moves played so far, passes are not recorded
+        self.lock = asyncio.Lock() # one request at a time per session
+
+    def to_json(self):
+        return {'session': self.id, 'strategy': self.strategy, 'time_budget': self.time_budget,
+                'history': self.history, 'state': game_to_state(self.game)}
+
+    @staticmethod
+    def from_json(data):
+        session = Session(data['session'], game_from_state(data['state']), data['strategy'], data['time_budget'])
+        session.history = data['history']
+        return session
+
+    def play(self, move):
+        # apply a move for the current player and hand over, skipping a player who has to pass
+        move = tuple(move)
+        if isinstance(self.game, KingOthello) and len(move) == 2: # a normal piece
+            move = move + (False,)
+        if move not in self.game.find_all_valid_moves():
+            raise ValueError('invalid move %s' % (list(move),))
+        self.game.take_move(*move)
+        self.history.append(list(move))
+        self.game.switch_turn()
+        if not self.game.find_all_valid_moves() and not self.game.is_game_end():
+            self.game.switch_turn() # pass
+
+    def summary(self):
+        reply = {'session': self.id, 'state': game_to_state(self.game),
+                 'valid_moves': [list(move) for move in self.game.find_all_valid_moves()],
+                 'game_over': bool(self.game.is_game_end())}
+        if reply['game_over']:
+            reply['result'] = int(self.game.finish_count(print_each_game_final=False))
+        return reply
+
+
+class GameServer:
+    def __init__(self, workers=None, state_dir=None, default_time_budget=DEFAULT_TIME_BUDGET):
+        self.sessions = {}
+        self.pool = ProcessPoolExecutor(max_workers=workers, initializer=mcts.mark_pool_worker)
+        self.state_dir = state_dir
+        self.default_time_budget = default_time_budget
+        self.latencies = {} # command -> list of seconds
+        self.server = None
+        self.client_tasks = set()
+        if state_dir:
+            os.makedirs(state_dir, exist_ok=True)
+            self.load_sessions()
+
+    # ------------ persistence ---------------
+
+    def session_path(self, session_id):
+        return os.path.join(self.state_dir, session_id + '.json')
+
+    def save_session(self, session):
+        # a session closed while one of its requests was running stays closed
+        if self.state_dir and self.sessions.get(session.id) is session:
+            tmp_path = self.session_path(session.id) + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(session.to_json(), f)
+            os.replace(tmp_path, self.session_path(session.id)) # never leave a half-written file behind
+
+    def load_sessions(self):
+        for name in os.listdir(self.state_dir):
+            if name.endswith('.json'):
+                with open(os.path.join(self.state_dir, name)) as f:
+                    session = Session.from_json(json.load(f))
+                self.sessions[session.id] = session
+
+    # ------------ commands ---------------
+
+    def get_session(self, message):
+        session = self.sessions.get(message.get('session'))
+        if session is None:
+            raise ValueError('unknown session %r' % message.get('session'))
+        return session
+
+    async def cmd_new(self, message):
+        dim = int(message.get('size', DIM))
+        game = KingOthello(dim=dim) if message.get('variant') == 'king' else Othello(dim=dim)
+        default_strategy = 'minimax|1|king_pos_score' if isinstance(game, KingOthello) else 'minimax|1|pos_score'
+        strategy = message.get('strategy', default_strategy)
+        parse_strategy(strategy, game) # refuse it now rather than at the first ai_move
+        session = Session(uuid.uuid4().hex, game, strategy, float(message.get('time_budget', self.default_time_budget)))
+        self.sessions[session.id] = session
+        self.save_session(session)
+        return session.summary()
+
+    async def cmd_move(self, message):
+        session = self.get_session(message)
+        async with session.lock:
+            session.play(message['move'])
+            self.save_session(session)
+            return session.summary()
+
+    async def cmd_ai_move(self, message):
+        session = self.get_session(message)
+        async with session.lock:
+            if not session.game.find_all_valid_moves():
+                raise ValueError('no valid move for the current player')
+            # the worker keeps to the budget itself (see ai_move), so time spent queued behind other sessions'
+            # searches is not taken from this one, and no abandoned search keeps a worker busy
+            loop = asyncio.get_running_loop()
+            move, timed_out = await loop.run_in_executor(self.pool, search_in_worker, game_to_state(session.game),
+                                                         session.strategy, session.time_budget)
+            session.play(move)
+            self.save_session(session)
+            reply = session.summary()
+            reply['move'] = list(move)
+            reply['timed_out'] = timed_out
+            return reply
+
+    async def cmd_state(self, message):
+        return self.get_session(message).summary()
+
+    async def cmd_close(self, message):
+        session = self.get_session(message)
+        async with session.lock: # let a running request finish first
+            self.sessions.pop(session.id, None)
+            if self.state_dir and os.path.exists(self.session_path(session.id)):
+                os.remove(self.session_path(session.id))
+        return {'session': session.id}
+
+    async def cmd_stats(self, message):
+        stats = {}
+        for cmd, values in self.latencies.items():
+            stats[cmd] = {'count': len(values), 'p50_ms': percentile(values, 50) * 1000,
+                          'p90_ms': percentile(values, 90) * 1000, 'p99_ms': percentile(values, 99) * 1000}
+        return {'sessions': len(self.sessions), 'latency': stats}
+
+    async def dispatch(self, message):
+        cmd = message.get('cmd')
+        handler = getattr(self, 'cmd_' + str(cmd), None)
+        if handler is None:
+            return {'ok': False, 'error': 'unknown command %r' % cmd}
+        start = time.perf_counter()
+        try:
+            reply = await handler(message)
+            reply['ok'] = True
+        except (KeyError, ValueError, TypeError) as e:
+            reply = {'ok': False, 'error': str(e)}
+        except Exception as e: # anything else is a bug, but it must not cost the client its connection
+            reply = {'ok': False, 'error': '%s: %s' % (type(e).__name__, e)}
+        values = self.latencies.setdefault(cmd, [])
+        values.append(time.perf_counter() - start)
+        if len(values) > LATENCY_WINDOW:
+            del values[:len(values) - LATENCY_WINDOW]
+        return reply
+
+    # ------------ networking ---------------
+
+    async def handle_client(self, reader, writer):
+        self.client_tasks.add(asyncio.current_task())
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    reply = {'ok': False, 'error': 'malformed json'}
+                else:
+                    reply = await self.dispatch(message)
+                writer.write(json.dumps(reply).encode() + b'\n')
+                await writer.drain()
+        except (asyncio.CancelledError, ConnectionError): # server shutting down or client went away
+            pass
+        finally:
+            self.client_tasks.discard(asyncio.current_task())
+            writer.close()
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        # port=0 picks a free port, read it back from self.port
+        self.server = await asyncio.start_server(self.handle_client, host, port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self.server
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        for task in list(self.client_tasks): # drop connections that are still open
+            task.cancel()
+        await asyncio.gather(*self.client_tasks, return_exceptions=True)
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+class Client:
+    # minimal client for scripts and local testing: reply = await client.request({'cmd': 'stats'})
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    @staticmethod
+    async def connect(host=DEFAULT_HOST, port=DEFAULT_PORT):
+        reader, writer = await asyncio.open_connection(host, port)
+        return Client(reader, writer)
+
+    async def request(self, message):
+        self.writer.write(json.dumps(message).encode() + b'\n')
+        await self.writer.drain()
+        return json.loads(await self.reader.readline())
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+async def serve(host, port, workers, state_dir, time_budget):
+    game_server = GameServer(workers=workers, state_dir=state_dir, default_time_budget=time_budget)
+    server = await game_server.start(host, port)
+    print('Serving on %s:%d' % (host, game_server.port))
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await game_server.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Headless Othello game server')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--workers', type=int, default=None, help='search processes, default: one per core')
+    parser.add_argument('--state-dir', default=None, help='directory to persist sessions in')
+    parser.add_argument('--time-budget', type=float, default=DEFAULT_TIME_BUDGET)
+    args = parser.parse_args()
+    asyncio.run(serve(args.host, args.port, args.workers, args.state_dir, args.time_budget))
@@ -0,0 +1,110 @@
+import minimax as mm
+import othello
+from kingOthello import KingOthello, NUM_INITIAL_KING
+import game_store
+from game_store import GameStore
+import numpy as np
+
+# on-disk format, symmetric lookups, variants and crash recovery of game_store.py; run with python -m pytest
+
+
+def random_games(num_game, seed=0):
+    records = []
+    othello.AI_vs_AI(num_game, 'random', 'random', print_each_game_final=False, print_game_summary=False, seed=seed,
+                     records=records)
+    return [{'moves': moves, 'result': res, 'black': 'random', 'white': 'random'} for res, moves in records]
+
+
+def test_round_trip(tmp_path):
+    games = random_games(20)
+    with GameStore(str(tmp_path)) as store:
+        assert store.add_games(games[:10]) == list(range(10))
+        assert store.import_games(games[10:]) == 10
+    with GameStore(str(tmp_path)) as store: # reopened: read back from disk
+        assert len(store) == 20
+        for game_id, game in enumerate(games):
+            stored = store.game(game_id)
+            assert stored['moves'] == [tuple(move) for move in game['moves']]
+            assert (stored['result'], stored['dim'], stored['variant']) == (game['result'], 8, 'normal')
+            assert stored['black'] == stored['white'] == 'random'
+
+
+def test_rotated_lookup(tmp_path):
+    game = random_games(1, seed=3)[0]
+    ply = 12
+    board, player, _ = list(game_store.replay(game['moves']))[ply]
+    next_x, next_y = game['moves'][ply]
+    with GameStore(str(tmp_path)) as store:
+        store.add_games([game])
+        rotated = np.rot90(board)
+        # np.rot90 moves square (x, y) of an n x n board to (n - 1 - y, x)
+        assert store.lookup(rotated, player) == [(0, ply, (7 - next_y, next_x), game['result'])]
+        assert store.lookup(board.T, player) == [(0, ply, (next_y, next_x), game['result'])]
+
+
+def test_variants_do_not_mix(tmp_path):
+    king_game = KingOthello()
+    moves = []
+    while not king_game.is_game_end() and len(moves) < 6:
+        valid_moves = king_game.find_all_valid_moves()
+        if valid_moves:
+            move = valid_moves[-1]
+            king_game.take_move(*move)
+            moves.append(move)
+        king_game.switch_turn()
+    with GameStore(str(tmp_path)) as store:
+        store.add_games(random_games(3))
+        store.add_game(moves, variant='king')
+        start = othello.Othello().board
+        assert {store.game(game_id)['variant'] for game_id, *_ in store.lookup(start, othello.BLACK)} == {'normal'}
+        king_start = store.lookup(start, othello.BLACK, 'king', (NUM_INITIAL_KING, NUM_INITIAL_KING))
+        assert [(game_id, ply, next_move) for game_id, ply, next_move, result in king_start] == [(3, 0, moves[0])]
+
+
+def test_bad_game_is_skipped(tmp_path):
+    games = random_games(3)
+    bad = dict(games[1], moves=[(0, 0)] + games[1]['moves'])
+    skipped = []
+    with GameStore(str(tmp_path)) as store:
+        size = store.size('games.dat')
+        try:
+            store.add_games([games[0], bad])
+        except ValueError:
+            pass
+        else:
+            raise AssertionError('an illegal game was added')
+        assert len(store) == 0 and store.size('games.dat') == size # nothing written
+        assert store.import_games([games[0], bad, games[2]], skipped) == 2
+        assert [number for number, error in skipped] == [1]
+        assert store.game(1)['moves'] == [tuple(move) for move in games[2]['moves']]
+
+
+def test_torn_append(tmp_path):
+    path = str(tmp_path)
+    games = random_games(4)
+    with GameStore(path) as store:
+        store.add_games(games[:3])
+    # an append interrupted before its offset was written: a record, tail entries and half an offset
+    with open(tmp_path / 'games.dat', 'ab') as f:
+        f.write(b'\x05\x00garbage')
+    with open(tmp_path / 'tail_hash.u64', 'ab') as f:
+        f.write(np.arange(3, dtype=game_store.HASH_DTYPE).tobytes())
+    with open(tmp_path / 'tail_entry.bin', 'ab') as f:
+        f.write(np.array([(3, 0, 0)] * 3, dtype=game_store.ENTRY_DTYPE).tobytes())
+    with open(tmp_path / 'offsets.u64', 'ab') as f:
+        f.write(b'\x01\x02\x03')
+    sizes = {name: (tmp_path / name).stat().st_size for name in ['games.dat', 'offsets.u64', 'tail_hash.u64']}
+
+    start = othello.Othello().board
+    with GameStore(path) as reader: # readers see the committed games and change nothing
+        assert len(reader) == 3
+        assert len(reader.lookup(start, othello.BLACK)) == 3
+        assert [reader.game(game_id)['moves'] for game_id in range(3)] == \
+            [[tuple(move) for move in game['moves']] for game in games[:3]]
+    assert sizes == {name: (tmp_path / name).stat().st_size for name in sizes}
+
+    with GameStore(path) as writer: # the next writer drops the torn append
+        assert writer.add_games(games[3:]) == [3]
+        assert len(writer.lookup(start, othello.BLACK)) == 4
+        assert writer.game(3)['moves'] == [tuple(move) for move in games[3]['moves']]
+        assert writer.stats()['tail_entries'] == sum(len(game['moves']) + 1 for game in games) # no stray entries
@@ -0,0 +1,36 @@
+import minimax as mm
+from othello import Othello, BLACK, WHITE, EMPTY
+from benchmark import sample_positions, sample_king_positions
+import numpy as np
+
+# bitboard mobility features against the square-by-square scan of Othello.scan_valid_moves; run with python -m pytest
+
+
+def scan_moves(board, player):
+    game = Othello(dim=board.shape[0])
+    game.board = board
+    game.current_player = player
+    return game.scan_valid_moves()
+
+
+def test_mobility_matches_scan():
+    for board in sample_positions(200, seed=2) + sample_positions(50, seed=3, dim=10):
+        assert mm.mobility_features(board)[0] == (len(scan_moves(board, BLACK)), len(scan_moves(board, WHITE)))
+
+
+def test_kings_block_lines_and_squares():
+    boards = sample_king_positions(300, seed=4)
+    assert any((board > WHITE).any() for board in boards) # kings were played
+    for board in boards:
+        assert mm.mobility_features(board)[0] == (len(scan_moves(board, BLACK)), len(scan_moves(board, WHITE)))
+        empty = board == EMPTY
+        # potential mobility: empty squares next to an enemy piece, kings are not empty
+        for player, enemy, potential in [(BLACK, WHITE, mm.mobility_features(board)[1][0]),
+                                         (WHITE, BLACK, mm.mobility_features(board)[1][1])]:
+            padded = np.pad(board == enemy, 1)
+            near_enemy = np.zeros_like(empty)
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    if dx or dy:
+                        near_enemy |= padded[1 + dx:1 + dx + board.shape[0], 1 + dy:1 + dy + board.shape[1]]
+            assert potential == np.count_nonzero(empty & near_enemy)
@@ -0,0 +1,95 @@
+import minimax as mm
+from server import GameServer, Client
+import asyncio
+
+# the game server end to end on localhost; run with python -m pytest
+
+
+async def play_session(state_dir):
+    game_server = GameServer(workers=1, state_dir=state_dir)
+    await game_server.start(port=0)
+    client = await Client.connect(port=game_server.port)
+    try:
+        reply = await client.request({'cmd': 'new', 'strategy': 'minimax|1|pos_score', 'time_budget': 2.0})
+        assert reply['ok'] and not reply['game_over']
+        session_id = reply['session']
+        assert [3, 5] in reply['valid_moves']
+
+        reply = await client.request({'cmd': 'move', 'session': session_id, 'move': [3, 5]})
+        assert reply['ok'] and reply['state']['current_player'] == mm.WHITE
+        bad = await client.request({'cmd': 'move', 'session': session_id, 'move': [0, 0]})
+        assert not bad['ok'] and 'invalid move' in bad['error']
+
+        reply = await client.request({'cmd': 'ai_move', 'session': session_id})
+        assert reply['ok'] and len(reply['move']) == 2
+        ai_move = reply['move']
+
+        state = await client.request({'cmd': 'state', 'session': session_id})
+        assert state['ok'] and state['state']['current_player'] == mm.BLACK
+
+        bogus = await client.request({'cmd': 'new', 'strategy': 'bogus'})
+        assert not bogus['ok'] # refused, and the connection is still usable
+        stats = await client.request({'cmd': 'stats'})
+        assert stats['ok'] and stats['sessions'] == 1
+        assert stats['latency']['ai_move']['count'] == 1
+
+        closed = await client.request({'cmd': 'new'})
+        assert (await client.request({'cmd': 'close', 'session': closed['session']}))['ok']
+        return session_id, [[3, 5], ai_move], closed['session']
+    finally:
+        await client.close()
+        await game_server.stop()
+
+
+async def restart(state_dir):
+    game_server = GameServer(workers=1, state_dir=state_dir)
+    await game_server.start(port=0)
+    client = await Client.connect(port=game_server.port)
+    try:
+        return game_server.sessions, await client.request({'cmd': 'stats'})
+    finally:
+        await client.close()
+        await game_server.stop()
+
+
+def test_session_survives_restart(tmp_path):
+    session_id, history, closed_id = asyncio.run(play_session(str(tmp_path)))
+    sessions, stats = asyncio.run(restart(str(tmp_path)))
+    assert stats['sessions'] == 1 and closed_id not in sessions
+    assert sessions[session_id].history == history
+    assert sessions[session_id].game.current_player == mm.BLACK
+
+
+def test_close_during_ai_move(tmp_path):
+    async def run():
+        game_server = GameServer(workers=1, state_dir=str(tmp_path))
+        await game_server.start(port=0)
+        searching, closing = await Client.connect(port=game_server.port), await Client.connect(port=game_server.port)
+        try:
+            session_id = (await searching.request({'cmd': 'new', 'strategy': 'minimax|6|pos_mobi',
+                                                        'time_budget': 0.5}))['session']
+            search = asyncio.ensure_future(searching.request({'cmd': 'ai_move', 'session': session_id}))
+            await asyncio.sleep(0.1) # the search is running
+            closed = await closing.request({'cmd': 'close', 'session': session_id})
+            return session_id, closed, await search
+        finally:
+            await searching.close()
+            await closing.close()
+            await game_server.stop()
+    session_id, closed, search = asyncio.run(run())
+    assert closed['ok'] and search['ok'] # close waited for the search
+    assert not (tmp_path / (session_id + '.json')).exists() # and the search did not save the session again
+
+
+def test_king_session_takes_two_element_moves():
+    async def run():
+        game_server = GameServer(workers=1)
+        await game_server.start(port=0)
+        client = await Client.connect(port=game_server.port)
+        try:
+            reply = await client.request({'cmd': 'new', 'variant': 'king', 'strategy': 'random'})
+            return await client.request({'cmd': 'move', 'session': reply['session'], 'move': [2, 4]})
+        finally:
+            await client.close()
+            await game_server.stop()
+    assert asyncio.run(run())['ok']
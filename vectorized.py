@@ -0,0 +1,216 @@
+import minimax as mm
+from othello import BLACK, WHITE
+import numpy as np
+import time
+
+# Lockstep simulation of many normal Othello games at once.
+# Every game is a pair of uint64 bitboards (bit x * 8 + y is square (x, y)), stored in arrays of length N,
+# and one step advances all unfinished games by one move or pass with numpy operations over the whole batch.
+# Policies: 'random' and the depth-0 minimax strategies 'minimax|0|pos_score', 'minimax|0|mobi', 'minimax|0|pos_mobi'.
+
+DIM = 8 # a board is packed into one uint64, so only 8x8 games can be simulated
+NUM_SQUARES = DIM * DIM
+FULL = np.uint64(0xFFFFFFFFFFFFFFFF)
+NOT_FIRST_COL = np.uint64(0xFEFEFEFEFEFEFEFE)
+NOT_LAST_COL = np.uint64(0x7F7F7F7F7F7F7F7F)
+SQUARE_BITS = np.left_shift(np.uint64(1), np.arange(NUM_SQUARES, dtype=np.uint64))
+BYTE_SHIFTS = np.arange(0, 64, 8, dtype=np.uint64)
+POPCOUNT_8 = np.array([bin(i).count('1') for i in range(256)], dtype=np.int64)
+EVAL_FUNCS = ['pos_score', 'mobi', 'pos_mobi']
+
+
+def direction_shifts():
+    # (amount, mask) for each of the 8 directions, positive amount shifts towards higher bit numbers
+    shifts = []
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            if dx or dy:
+                mask = NOT_FIRST_COL if dy == 1 else NOT_LAST_COL if dy == -1 else FULL
+                shifts.append((dx * DIM + dy, mask))
+    return shifts
+
+SHIFTS = direction_shifts()
+
+
+def shift(bits, amount, mask):
+    if amount > 0:
+        return np.left_shift(bits, np.uint64(amount)) & mask
+    else:
+        return np.right_shift(bits, np.uint64(-amount)) & mask
+
+
+def byte_table(weights):
+    # table[k, b]: sum of weights of the bits set in byte value b at byte position k
+    table = np.zeros((8, 256), dtype=np.int64)
+    for k in range(8):
+        for b in range(256):
+            table[k, b] = sum(weights[8 * k + i] for i in range(8) if b >> i & 1)
+    return table
+
+POS_SCORE_TABLE = byte_table(np.asarray(mm.pos_score_map).ravel())
+
+
+def weighted_sum(bits, table):
+    # sum of table weights over the set bits of every bitboard, eight byte lookups per board
+    total = np.zeros(bits.shape, dtype=np.int64)
+    for k in range(8):
+        total += table[k][(np.right_shift(bits, BYTE_SHIFTS[k]) & np.uint64(255)).astype(np.intp)]
+    return total
+
+
+def popcount(bits):
+    if hasattr(np, 'bitwise_count'): # numpy >= 2.0
+        return np.bitwise_count(bits).astype(np.int64)
+    total = np.zeros(bits.shape, dtype=np.int64)
+    for k in range(8):
+        total += POPCOUNT_8[(np.right_shift(bits, BYTE_SHIFTS[k]) & np.uint64(255)).astype(np.intp)]
+    return total
+
+
+def legal_moves(own, opp):
+    # bitboard of legal moves for the owner of `own`, for every game of the batch
+    empty = ~(own | opp)
+    moves = np.zeros_like(own)
+    for amount, mask in SHIFTS:
+        line = shift(own, amount, mask) & opp
+        for _ in range(DIM - 3):
+            line |= shift(line, amount, mask) & opp
+        moves |= shift(line, amount, mask) & empty
+    return moves
+
+
+def flips(own, opp, move):
+    # opponent pieces reversed when `move` (one bit per game) is played
+    flipped = np.zeros_like(own)
+    for amount, mask in SHIFTS:
+        line = shift(move, amount, mask) & opp
+        for _ in range(DIM - 3):
+            line |= shift(line, amount, mask) & opp
+        closed = (shift(line, amount, mask) & own) != 0
+        flipped |= np.where(closed, line, np.uint64(0))
+    return flipped
+
+
+def evaluate(black, white, eval_func):
+    # same scores as the minimax evaluators at depth 0, from Black's point of view
+    score = np.zeros(black.shape, dtype=np.int64)
+    if eval_func in ('pos_score', 'pos_mobi'):
+        score += weighted_sum(black, POS_SCORE_TABLE) - weighted_sum(white, POS_SCORE_TABLE)
+    if eval_func in ('mobi', 'pos_mobi'):
+        score += popcount(legal_moves(black, white)) - popcount(legal_moves(white, black))
+    return score
+
+
+def parse_strategy(strategy):
+    # 'random' -> None, 'minimax|0|pos_score' -> 'pos_score'
+    if strategy == 'random':
+        return None
+    params = strategy.split('|')
+    if len(params) != 3 or params[0] != 'minimax' or params[1] != '0' or params[2] not in EVAL_FUNCS:
+        raise ValueError("vectorized simulation supports 'random' and 'minimax|0|<%s>', got %r"
+                         % ('|'.join(EVAL_FUNCS), strategy))
+    return params[2]
+
+
+def random_choice(moves, rng):
+    # one uniformly chosen set bit of every (non-empty) moves bitboard
+    is_set = (moves[:, None] & SQUARE_BITS) != 0 # (n, 64)
+    counts = is_set.sum(axis=1)
+    pick = (rng.random(len(moves)) * counts).astype(np.int64) # index among the set bits
+    square = np.argmax(np.cumsum(is_set, axis=1) > pick[:, None], axis=1)
+    return SQUARE_BITS[square]
+
+
+def greedy_choice(own, opp, moves, is_black, eval_func, rng):
+    # the legal move with the best depth-0 score, ties broken at random like minimax_move
+    best = np.full(len(moves), -np.inf)
+    choice = np.zeros_like(moves)
+    sign = np.where(is_black, 1.0, -1.0) # white minimizes Black's score
+    noise = rng.random((len(moves), NUM_SQUARES)) * 0.5 # scores are integers, so this only breaks ties
+    candidates = np.bitwise_or.reduce(moves) if len(moves) else np.uint64(0)
+    for square in range(NUM_SQUARES):
+        bit = SQUARE_BITS[square]
+        if not candidates & bit:
+            continue
+        legal = (moves & bit) != 0
+        flipped = flips(own, opp, np.full(own.shape, bit))
+        new_own = own | bit | flipped
+        new_opp = opp & ~flipped
+        black = np.where(is_black, new_own, new_opp)
+        white = np.where(is_black, new_opp, new_own)
+        value = np.where(legal, sign * evaluate(black, white, eval_func) + noise[:, square], -np.inf)
+        better = value > best
+        best = np.where(better, value, best)
+        choice = np.where(better, bit, choice)
+    return choice
+
+
+def choose_moves(own, opp, moves, is_black, eval_func, rng):
+    if eval_func is None:
+        return random_choice(moves, rng)
+    return greedy_choice(own, opp, moves, is_black, eval_func, rng)
+
+
+def simulate_batch(num_game, black_strat='random', white_strat='random', rng=None):
+    """
+    Play num_game games in lockstep, returns the final (black, white) bitboards.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    policies = {BLACK: parse_strategy(black_strat), WHITE: parse_strategy(white_strat)}
+    black = np.full(num_game, SQUARE_BITS[3 * DIM + 3] | SQUARE_BITS[4 * DIM + 4])
+    white = np.full(num_game, SQUARE_BITS[3 * DIM + 4] | SQUARE_BITS[4 * DIM + 3])
+    black_to_move = np.ones(num_game, dtype=bool)
+    active = np.arange(num_game) # games that are not finished yet
+
+    while len(active):
+        is_black = black_to_move[active]
+        own = np.where(is_black, black[active], white[active])
+        opp = np.where(is_black, white[active], black[active])
+        moves = legal_moves(own, opp)
+        has_move = moves != 0
+
+        chosen = np.zeros_like(moves)
+        for player, policy in policies.items():
+            side = has_move & (is_black == (player == BLACK))
+            if side.any():
+                chosen[side] = choose_moves(own[side], opp[side], moves[side], is_black[side], policy, rng)
+        flipped = flips(own, opp, chosen) # chosen is 0 for games that pass, so nothing flips there
+        own = own | chosen | flipped
+        opp = opp & ~flipped
+        black[active] = np.where(is_black, own, opp)
+        white[active] = np.where(is_black, opp, own)
+
+        # a game without a move ends if the opponent cannot move either, otherwise it is a pass
+        finished = ~has_move & (legal_moves(opp, own) == 0)
+        black_to_move[active] = ~is_black
+        active = active[~finished]
+    return black, white
+
+
+def simulate(num_game=10000, black_strat='random', white_strat='random', seed=None, batch_size=10000,
+             print_game_summary=True, dim=DIM):
+    """
+    Vectorized counterpart of othello.AI_vs_AI: same win-rate statistics, returns the black winrate.
+    Games are played batch_size at a time to bound memory.
+    """
+    if dim != DIM:
+        raise ValueError('vectorized simulation plays 8x8 games only, got dim=%r; use othello.AI_vs_AI' % dim)
+    rng = np.random.default_rng(seed)
+    black_wins = white_wins = 0
+    for start in range(0, num_game, batch_size):
+        black, white = simulate_batch(min(batch_size, num_game - start), black_strat, white_strat, rng)
+        net = popcount(black) - popcount(white)
+        black_wins += int(np.count_nonzero(net > 0))
+        white_wins += int(np.count_nonzero(net < 0))
+
+    black_winrate = black_wins / (black_wins + white_wins)
+    if print_game_summary:
+        print("Black - White : {} - {}".format(black_wins, white_wins))
+        print("Black winrate: %.2f" % black_winrate)
+    return black_winrate
+
+
+if __name__ == '__main__':
+    start = time.perf_counter()
+    simulate(10000, 'random', 'minimax|0|pos_score', seed=1)
+    print('%.0f games/sec' % (10000 / (time.perf_counter() - start)))